@@ -1,5 +1,18 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
+from django.utils.module_loading import autodiscover_modules
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        # Исполнителю очереди задачи нужны по именам до первого вызова.
+        autodiscover_modules('tasks')
+        if settings.DB_HEALTH_CHECKS:
+            from core.db import close_unusable_connections
+            request_started.connect(
+                close_unusable_connections,
+                dispatch_uid='core.db.close_unusable_connections'
+            )
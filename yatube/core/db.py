@@ -0,0 +1,73 @@
+from django.db import NotSupportedError, connections, router
+
+
+def close_unusable_connections(**kwargs):
+    """Закрывает постоянные соединения, которые перестали отвечать.
+
+    Django 2.2 проверяет соединение с CONN_MAX_AGE только после ошибки
+    в нём, поэтому соединение, оборванное базой или балансировщиком
+    между запросами, уронило бы первый запрос. Проверка стоит одного
+    лёгкого запроса к базе на соединение.
+    """
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        if not connection.is_usable():
+            connection.close()
+
+
+def bulk_insert(model, objects):
+    """bulk_create, который пишет значения полей как есть.
+
+    bulk_create вызывает pre_save полей, и auto_now_add подменяет
+    заданную дату временем вставки. Здесь pre_save пропускается для
+    полей auto_now_add, которым задано значение, поэтому дата пишется
+    тем же INSERT, а не вторым проходом UPDATE. Ключи
+    назначает база, они проставляются объектам: на PostgreSQL через
+    RETURNING, на SQLite по last_insert_rowid(), потому что строки
+    одного INSERT получают ключи подряд — SQLite не пускает второго
+    писателя, пока идёт вставка.
+    """
+    objects = list(objects)
+    if not objects:
+        return objects
+    connection = connections[router.db_for_write(model)]
+    features = connection.features
+    if not (
+        features.can_return_ids_from_bulk_insert
+        or connection.vendor == 'sqlite'
+    ):
+        raise NotSupportedError(
+            f'bulk_insert не умеет получать ключи на {connection.vendor}'
+        )
+    meta = model._meta
+    fields = [
+        field for field in meta.concrete_fields
+        if field is not meta.auto_field
+    ]
+    for obj in objects:
+        for field in fields:
+            if getattr(field, 'auto_now_add', False) and (
+                getattr(obj, field.attname) is not None
+            ):
+                continue
+            setattr(obj, field.attname, field.pre_save(obj, add=True))
+    queryset = model._base_manager.using(connection.alias)
+    batch_size = max(connection.ops.bulk_batch_size(fields, objects), 1)
+    for start in range(0, len(objects), batch_size):
+        batch = objects[start:start + batch_size]
+        if features.can_return_ids_from_bulk_insert:
+            ids = queryset._insert(batch, fields, return_id=True, raw=True)
+            if len(batch) == 1:
+                ids = [ids]
+        else:
+            queryset._insert(batch, fields, raw=True)
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT last_insert_rowid()')
+                last = cursor.fetchone()[0]
+            ids = range(last - len(batch) + 1, last + 1)
+        for obj, pk in zip(batch, ids):
+            obj.pk = pk
+            obj._state.adding = False
+            obj._state.db = connection.alias
+    return objects
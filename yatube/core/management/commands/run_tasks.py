@@ -0,0 +1,88 @@
+import multiprocessing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import tasks
+
+
+def describe(stats):
+    for name, values in sorted(stats.items()):
+        yield (
+            f'{name}: выполнений {values["runs"]}, '
+            f'падений {values["failures"]}, '
+            f'в среднем {values["total"] / values["runs"] * 1000:.1f} мс, '
+            f'максимум {values["max"] * 1000:.1f} мс'
+        )
+
+
+def work(burst):
+    try:
+        tasks.work(burst)
+    except KeyboardInterrupt:
+        pass
+
+
+def child(burst, results):
+    work(burst)
+    results.put(tasks.stats())
+
+
+def merge(total, stats):
+    for name, values in stats.items():
+        if name not in total:
+            total[name] = dict(values)
+            continue
+        merged = total[name]
+        for key in ('runs', 'failures', 'total'):
+            merged[key] += values[key]
+        merged['max'] = max(merged['max'], values['max'])
+    return total
+
+
+class Command(BaseCommand):
+    help = 'Выполняет задачи из очереди core.tasks.DatabaseBackend'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=settings.TASKS_PROCESSES,
+            help='Сколько процессов-исполнителей запустить',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Завершиться, когда готовых задач не останется',
+        )
+
+    def run_processes(self, count, burst):
+        """Запускает исполнителей и собирает их статистику при выходе."""
+        # Дочерние процессы не должны делить открытые соединения.
+        connections.close_all()
+        results = multiprocessing.SimpleQueue()
+        workers = [
+            multiprocessing.Process(target=child, args=(burst, results))
+            for _ in range(count)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            try:
+                worker.join()
+            except KeyboardInterrupt:
+                # Ctrl+C получают и дочерние процессы, ждём их отчётов.
+                worker.join()
+        stats = {}
+        while not results.empty():
+            merge(stats, results.get())
+        return stats
+
+    def handle(self, *args, **options):
+        if options['processes'] <= 1:
+            work(options['burst'])
+            stats = tasks.stats()
+        else:
+            stats = self.run_processes(
+                options['processes'], options['burst']
+            )
+        for line in describe(stats):
+            self.stdout.write(line)
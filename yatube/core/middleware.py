@@ -0,0 +1,112 @@
+import logging
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def template_line():
+    """Шаблон и строка, при рендеринге которой выполняется запрос."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            token = getattr(node, 'token', None)
+            origin = getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                return f'{origin.template_name}:{token.lineno}'
+        frame = frame.f_back
+    return None
+
+
+class QueryRecorder:
+    """execute_wrapper, который считает запросы и время в базе."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+        self.shapes = Counter()
+        self.locations = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        shape = IN_LIST.sub('IN (...)', sql)
+        self.shapes[shape] += 1
+        if self.shapes[shape] == 2:
+            self.locations[shape] = template_line()
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+    def suspects(self, threshold):
+        """Одинаковые по форме запросы, повторённые threshold и более раз."""
+        return [
+            (shape, repeats, self.locations.get(shape))
+            for shape, repeats in self.shapes.most_common()
+            if repeats >= threshold
+        ]
+
+
+class QueryBudgetMiddleware:
+    """Считает SQL-запросы запроса и ищет кандидатов в N+1.
+
+    Итоги пишутся в заголовки X-DB-Queries и X-DB-Time и в лог.
+    Бюджеты задаются в QUERY_BUDGETS по имени view; при
+    QUERY_BUDGET_RAISE превышение бюджета поднимает исключение,
+    чтобы оно роняло тесты. Без QUERY_BUDGET_ENABLED Django
+    исключает middleware из цепочки, и запросы не замеряются.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        response['X-DB-Queries'] = str(recorder.count)
+        response['X-DB-Time'] = f'{recorder.duration * 1000:.1f}ms'
+
+        view_name = getattr(request.resolver_match, 'view_name', None)
+        suspects = recorder.suspects(settings.QUERY_REPEAT_THRESHOLD)
+        for shape, repeats, location in suspects:
+            logger.warning(
+                'Возможный N+1 в %s: %d одинаковых запросов из %s: %s',
+                view_name, repeats, location or 'кода view', shape,
+            )
+        logger.info(
+            '%s %s: %d запросов, %.1f мс',
+            request.method, request.path,
+            recorder.count, recorder.duration * 1000,
+        )
+
+        budget = settings.QUERY_BUDGETS.get(view_name)
+        if budget is not None and recorder.count > budget:
+            message = (
+                f'{view_name}: {recorder.count} запросов '
+                f'при бюджете {budget}'
+            )
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -11,3 +11,71 @@ class CreateModel(models.Model):
     class Meta:
         abstract = True
         ordering = ('-created',)
+
+
+class VersionField(models.PositiveIntegerField):
+    """Номер правки, который UPDATE увеличивает выражением version + 1.
+
+    В базе параллельные правки не теряют инкрементов, а в объекте
+    сразу, до сигналов post_save, лежит число на единицу больше
+    прежнего, без дополнительного SELECT. Если объект был устаревшим,
+    число в нём меньше номера в базе.
+    """
+
+    def pre_save(self, model_instance, add):
+        value = getattr(model_instance, self.attname)
+        if add:
+            return value
+        setattr(model_instance, self.attname, value + 1)
+        return models.F(self.attname) + 1
+
+
+class VersionedModel(CreateModel):
+    """Модель с датой и номером правки для проверки кешей."""
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+    version = VersionField(
+        default=1,
+        editable=False,
+        verbose_name='Номер правки',
+    )
+
+    class Meta(CreateModel.Meta):
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not self._state.adding:
+            kwargs['update_fields'] = {*update_fields, 'updated', 'version'}
+        super().save(*args, **kwargs)
+
+
+class QueuedTask(models.Model):
+    """Вызов задачи в очереди core.tasks.DatabaseBackend."""
+    name = models.CharField(max_length=200, verbose_name='Задача')
+    payload = models.TextField(verbose_name='Аргументы в JSON')
+    run_at = models.DateTimeField(verbose_name='Выполнить не раньше')
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток',
+    )
+    failed = models.BooleanField(
+        default=False,
+        verbose_name='Попытки исчерпаны',
+    )
+    error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+
+    class Meta:
+        verbose_name = 'Задача в очереди'
+        verbose_name_plural = 'Задачи в очереди'
+        indexes = [
+            models.Index(
+                fields=['failed', 'run_at'],
+                name='queued_task_ready_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
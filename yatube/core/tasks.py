@@ -0,0 +1,269 @@
+"""Фоновые задачи.
+
+Функция, помеченная @task, по-прежнему вызывается напрямую, а
+f.delay(*args, **kwargs) отдаёт вызов бэкенду TASKS_BACKEND:
+
+- ImmediateBackend выполняет задачу в том же потоке после фиксации
+  транзакции;
+- ThreadPoolBackend — в пуле из TASKS_WORKERS потоков процесса, для
+  разработки;
+- DatabaseBackend записывает вызов в таблицу QueuedTask в текущей
+  транзакции, а выполняют его процессы команды run_tasks.
+
+Аргументы сериализуются в JSON уже в delay(), чтобы несовместимый
+вызов падал одинаково при любом бэкенде. Упавшая задача повторяется
+до retries раз с паузой backoff * 2 ** (номер попытки - 1) секунд;
+ThreadPoolBackend на время паузы поток не занимает.
+Время каждого выполнения пишется в лог и копится в stats().
+
+Задачи ищутся в модулях tasks приложений при запуске (см.
+core.apps), под именем модуль.функция.
+"""
+import json
+import logging
+import threading
+import time
+import traceback
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial, update_wrapper
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.models import QueuedTask
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+_stats = defaultdict(lambda: {'runs': 0, 'failures': 0, 'total': 0.0,
+                              'max': 0.0})
+_stats_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class Task:
+    def __init__(self, func, retries, backoff):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.retries = retries
+        self.backoff = backoff
+        update_wrapper(self, func)
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        get_backend().enqueue(self, json.dumps([args, kwargs]))
+
+    def retry_after(self, attempt):
+        backoff = settings.TASKS_BACKOFF if self.backoff is None else (
+            self.backoff
+        )
+        return timedelta(seconds=backoff * 2 ** (attempt - 1))
+
+    def max_retries(self):
+        return settings.TASKS_RETRIES if self.retries is None else (
+            self.retries
+        )
+
+    def run(self, payload):
+        """Одно выполнение с замером времени, ошибки пробрасываются."""
+        args, kwargs = json.loads(payload)
+        start = time.perf_counter()
+        ok = False
+        try:
+            result = self.func(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            duration = time.perf_counter() - start
+            _record(self.name, duration, ok)
+            logger.info(
+                'Задача %s: %s, %.1f мс',
+                self.name, 'выполнена' if ok else 'упала', duration * 1000,
+            )
+
+
+def task(func=None, *, retries=None, backoff=None):
+    """Делает функцию задачей с методом delay().
+
+    retries и backoff по умолчанию берутся из TASKS_RETRIES и
+    TASKS_BACKOFF.
+    """
+    if func is None:
+        return partial(task, retries=retries, backoff=backoff)
+    wrapped = Task(func, retries, backoff)
+    _registry[wrapped.name] = wrapped
+    return wrapped
+
+
+def _record(name, duration, ok):
+    with _stats_lock:
+        stats = _stats[name]
+        stats['runs'] += 1
+        stats['failures'] += not ok
+        stats['total'] += duration
+        stats['max'] = max(stats['max'], duration)
+
+
+def stats():
+    """Число выполнений, падений и время задач в этом процессе."""
+    with _stats_lock:
+        return {name: dict(values) for name, values in _stats.items()}
+
+
+def get_backend():
+    return import_string(settings.TASKS_BACKEND)()
+
+
+def _should_retry(task, attempt):
+    """Вызывается при ошибке: False и запись в лог после последней
+    попытки."""
+    if attempt > task.max_retries():
+        logger.exception(
+            'Задача %s не выполнена за %d попыток', task.name, attempt
+        )
+        return False
+    return True
+
+
+def execute(task, payload):
+    """Выполняет задачу с повторами в текущем потоке."""
+    attempt = 1
+    while True:
+        try:
+            return task.run(payload)
+        except Exception:
+            if not _should_retry(task, attempt):
+                return None
+            time.sleep(task.retry_after(attempt).total_seconds())
+            attempt += 1
+
+
+class ImmediateBackend:
+    """Задачи без фона, в запросе после фиксации: для тестов."""
+
+    def enqueue(self, task, payload):
+        transaction.on_commit(lambda: execute(task, payload))
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.TASKS_WORKERS,
+                thread_name_prefix='tasks',
+            )
+        return _executor
+
+
+def _execute_in_thread(task, payload, attempt=1):
+    # Соединение с базой у каждого потока своё, закрываем его сами.
+    try:
+        task.run(payload)
+    except Exception:
+        if _should_retry(task, attempt):
+            # Поток пула не ждёт паузы: повтор отправит в пул таймер.
+            timer = threading.Timer(
+                task.retry_after(attempt).total_seconds(),
+                get_executor().submit,
+                (_execute_in_thread, task, payload, attempt + 1),
+            )
+            timer.daemon = True
+            timer.start()
+    finally:
+        connection.close()
+
+
+class ThreadPoolBackend:
+    """Задачи в потоках процесса: теряются при его перезапуске."""
+
+    def enqueue(self, task, payload):
+        transaction.on_commit(
+            lambda: get_executor().submit(_execute_in_thread, task, payload)
+        )
+
+
+class DatabaseBackend:
+    """Очередь в таблице QueuedTask, выполняется командой run_tasks.
+
+    Вызов записывается в той же транзакции, что и данные, которые он
+    обрабатывает, поэтому не теряется при перезапуске и не выполняется
+    при откате.
+    """
+
+    def enqueue(self, task, payload):
+        QueuedTask.objects.create(
+            name=task.name, payload=payload, run_at=timezone.now()
+        )
+
+
+def claim(now=None):
+    """Берёт в аренду на TASKS_LEASE самую раннюю готовую задачу.
+
+    Аренда ставится условным UPDATE по прочитанному run_at, поэтому
+    одну задачу получает только один процесс. Если процесс умер, не
+    закончив задачу, после аренды она выполнится снова.
+    """
+    now = now or timezone.now()
+    while True:
+        ready = QueuedTask.objects.filter(
+            failed=False, run_at__lte=now
+        ).order_by('run_at', 'pk').values('pk', 'run_at').first()
+        if ready is None:
+            return None
+        if QueuedTask.objects.filter(**ready).update(
+            run_at=now + settings.TASKS_LEASE,
+            attempts=F('attempts') + 1,
+        ):
+            return QueuedTask.objects.get(pk=ready['pk'])
+
+
+def run_queued():
+    """Выполняет одну задачу из очереди, False — если готовых нет."""
+    queued = claim()
+    if queued is None:
+        return False
+    tasks = QueuedTask.objects.filter(pk=queued.pk)
+    task = _registry.get(queued.name)
+    try:
+        if task is None:
+            raise LookupError(f'Неизвестная задача {queued.name}')
+        task.run(queued.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if task is not None and queued.attempts <= task.max_retries():
+            tasks.update(
+                run_at=timezone.now() + task.retry_after(queued.attempts),
+                error=error,
+            )
+        else:
+            logger.error(
+                'Задача %s не выполнена за %d попыток:\n%s',
+                queued.name, queued.attempts, error,
+            )
+            tasks.update(failed=True, error=error)
+    else:
+        tasks.delete()
+    return True
+
+
+def work(burst=False):
+    """Цикл процесса-исполнителя очереди DatabaseBackend.
+
+    С burst=True возвращается, когда готовых задач не осталось.
+    """
+    while True:
+        if run_queued():
+            continue
+        if burst:
+            return
+        close_old_connections()
+        time.sleep(settings.TASKS_POLL_INTERVAL)
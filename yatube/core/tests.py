@@ -1,4 +1,44 @@
-from django.test import TestCase, Client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import (
+    Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from core import tasks
+from core.db import bulk_insert, close_unusable_connections
+from core.middleware import QueryBudgetExceeded, QueryBudgetMiddleware
+from core.models import QueuedTask
+from posts.models import Post
+
+
+User = get_user_model()
+
+calls = []
+
+
+@tasks.task(retries=1, backoff=60)
+def flaky(key, fails=0):
+    calls.append(key)
+    if calls.count(key) <= fails:
+        raise RuntimeError('Сбой')
 
 
 class TestErrorsUrl(TestCase):
@@ -16,3 +56,277 @@ class TestErrorsUrl(TestCase):
             with self.subTest(address=address):
                 response = self.client.get(address)
                 self.assertTemplateUsed(response, template)
+
+
+class QueryBudgetMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='StasBasov')
+        for num in range(3):
+            author = User.objects.create_user(username=f'author{num}')
+            Post.objects.create(text=f'Пост {num}', author=author)
+
+    def test_headers(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertGreater(int(response['X-DB-Queries']), 0)
+        self.assertTrue(response['X-DB-Time'].endswith('ms'))
+
+    def test_n_plus_one_with_template_line(self):
+        template = Template(
+            '{% for post in posts %}\n{{ post.author.username }}{% endfor %}'
+        )
+        template.origin.template_name = 'n_plus_one.html'
+
+        def view(request):
+            request.resolver_match = None
+            return HttpResponse(
+                template.render(Context({'posts': Post.objects.all()}))
+            )
+
+        middleware = QueryBudgetMiddleware(view)
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            middleware(RequestFactory().get('/'))
+        self.assertIn('n_plus_one.html:2', logs.output[0])
+
+    @override_settings(
+        QUERY_BUDGETS={'posts:index': 1}, QUERY_BUDGET_RAISE=True
+    )
+    def test_budget_exceeded(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('posts:index'))
+
+    @override_settings(QUERY_BUDGET_ENABLED=False)
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryBudgetMiddleware(HttpResponse)
+
+
+PROD_CHECK = """
+import json
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.template import engines
+from django.test import Client
+
+response = Client().get('/')
+cache = caches['default']
+cache.set('probe', 1)
+print(json.dumps({
+    'status': response.status_code,
+    'debug': settings.DEBUG,
+    'cache': type(cache).__name__,
+    'probe': cache.get('probe'),
+    'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+    'loaders': [type(loader).__name__
+                for loader in engines['django'].engine.template_loaders],
+    'query_headers': response.has_header('X-DB-Queries'),
+}))
+"""
+
+
+class ProdSettingsTest(TestCase):
+    def run_manage(self, env, *args):
+        return subprocess.run(
+            [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py')]
+            + list(args),
+            env=env, capture_output=True, text=True, timeout=120,
+        )
+
+    def test_prod_profile_boots(self):
+        """Профиль prod собирается из окружения и отдаёт главную"""
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(
+                os.environ,
+                YATUBE_ENV='prod',
+                SECRET_KEY='test-secret',
+                ALLOWED_HOSTS='testserver,localhost',
+                # SQLite вместо PostgreSQL, файловый кеш во временном
+                # каталоге.
+                DB_ENGINE='sqlite3',
+                DB_NAME=os.path.join(directory, 'db.sqlite3'),
+                CACHE_BACKEND='file',
+                CACHE_LOCATION=os.path.join(directory, 'cache'),
+                SECURE_COOKIES='0',
+                POST_IMAGES_IN_TASKS='0',
+            )
+            env.pop('DJANGO_SETTINGS_MODULE', None)
+            for args in (
+                ('check', '--deploy', '--fail-level', 'ERROR'),
+                ('migrate', '-v0'),
+            ):
+                result = self.run_manage(env, *args)
+                self.assertEqual(result.returncode, 0, result.stderr)
+            result = self.run_manage(env, 'shell', '-c', PROD_CHECK)
+            self.assertEqual(result.returncode, 0, result.stderr)
+            report = json.loads(result.stdout.splitlines()[-1])
+        self.assertEqual(report, {
+            'status': 200,
+            'debug': False,
+            'cache': 'FileBasedCache',
+            'probe': 1,
+            'conn_max_age': 60,
+            'loaders': ['Loader'],
+            'query_headers': False,
+        })
+
+    def test_prod_profile_requires_secret_key(self):
+        env = dict(os.environ, YATUBE_ENV='prod', ALLOWED_HOSTS='localhost')
+        env.pop('SECRET_KEY', None)
+        env.pop('DJANGO_SETTINGS_MODULE', None)
+        result = self.run_manage(env, 'check')
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('SECRET_KEY', result.stderr)
+
+
+class HealthCheckTest(TestCase):
+    def test_unusable_connection_closed(self):
+        connection = mock.Mock(in_atomic_block=False)
+        connection.is_usable.return_value = False
+        with mock.patch('core.db.connections') as connections:
+            connections.all.return_value = [connection]
+            close_unusable_connections()
+        connection.close.assert_called_once()
+
+
+class BulkInsertTest(TestCase):
+    def test_keeps_auto_now_add_dates_and_assigns_keys(self):
+        """Заданные даты пишутся одним INSERT, ключи назначает база"""
+        author = User.objects.create_user(username='Stas')
+        created = timezone.now() - timedelta(days=30)
+        last = Post.objects.create(author=author, text='Последний').pk
+        posts = [
+            Post(author=author, text=f'Старый {num}', created=created)
+            for num in range(3)
+        ]
+        # На SQLite ключи читаются вторым запросом.
+        returning = connection.features.can_return_ids_from_bulk_insert
+        with self.assertNumQueries(1 if returning else 2):
+            bulk_insert(Post, posts)
+        self.assertEqual(
+            [post.pk for post in posts], [last + 1, last + 2, last + 3]
+        )
+        for post in posts:
+            self.assertEqual(Post.objects.get(pk=post.pk).created, created)
+        self.assertTrue(Post._meta.get_field('created').auto_now_add)
+        fresh = Post.objects.create(author=author, text='Новый')
+        self.assertGreater(fresh.pk, posts[-1].pk)
+        self.assertGreater(fresh.created, created + timedelta(days=29))
+
+
+class TasksTest(TransactionTestCase):
+    def setUp(self):
+        calls.clear()
+
+    def runs(self):
+        return tasks.stats().get(flaky.name, {}).get('runs', 0)
+
+    @override_settings(TASKS_BACKEND='core.tasks.ImmediateBackend')
+    def test_immediate_after_commit_with_retry(self):
+        runs = self.runs()
+        with mock.patch('core.tasks.time.sleep') as sleep:
+            with transaction.atomic():
+                flaky.delay('immediate', fails=1)
+                self.assertEqual(calls, [])
+        self.assertEqual(calls, ['immediate', 'immediate'])
+        sleep.assert_called_once_with(60)
+        self.assertEqual(self.runs(), runs + 2)
+
+    def test_thread_pool_schedules_retry(self):
+        """Повтор в пуле потоков ставится таймером, а не ждёт в потоке"""
+        payload = json.dumps([['thread'], {'fails': 1}])
+        with mock.patch('core.tasks.time.sleep') as sleep, \
+                mock.patch('core.tasks.threading.Timer') as timer:
+            tasks._execute_in_thread(flaky, payload)
+        sleep.assert_not_called()
+        delay, submit, args = timer.call_args[0]
+        self.assertEqual(delay, 60)
+        self.assertEqual(args, (tasks._execute_in_thread, flaky, payload, 2))
+        timer.return_value.start.assert_called_once()
+        tasks._execute_in_thread(*args[1:])
+        self.assertEqual(calls, ['thread', 'thread'])
+
+    def test_arguments_must_be_json(self):
+        with self.assertRaises(TypeError):
+            flaky.delay(object())
+
+    @override_settings(TASKS_BACKEND='core.tasks.DatabaseBackend')
+    def test_database_queue_backoff(self):
+        """Задача из таблицы повторяется с паузой и помечается упавшей"""
+        flaky.delay('queued', fails=5)
+        queued = QueuedTask.objects.get()
+        self.assertEqual(queued.name, 'core.tests.flaky')
+        self.assertTrue(tasks.run_queued())
+        queued.refresh_from_db()
+        self.assertEqual(queued.attempts, 1)
+        self.assertIn('Сбой', queued.error)
+        self.assertGreater(
+            queued.run_at, timezone.now() + timedelta(seconds=50)
+        )
+        self.assertFalse(tasks.run_queued())
+        QueuedTask.objects.update(run_at=timezone.now())
+        with self.assertLogs('core.tasks', 'ERROR'):
+            self.assertTrue(tasks.run_queued())
+        queued.refresh_from_db()
+        self.assertEqual((queued.attempts, queued.failed), (2, True))
+        self.assertFalse(tasks.run_queued())
+        self.assertEqual(calls, ['queued', 'queued'])
+
+    @override_settings(TASKS_BACKEND='core.tasks.DatabaseBackend')
+    def test_claim_is_exclusive(self):
+        flaky.delay('claimed')
+        now = timezone.now()
+        self.assertIsNotNone(tasks.claim(now))
+        self.assertIsNone(tasks.claim(now))
+        self.assertIsNotNone(tasks.claim(now + settings.TASKS_LEASE))
+
+    @override_settings(TASKS_BACKEND='core.tasks.DatabaseBackend')
+    def test_run_tasks_command(self):
+        flaky.delay('command')
+        out = StringIO()
+        call_command('run_tasks', '--burst', '--processes=1', stdout=out)
+        self.assertFalse(QueuedTask.objects.exists())
+        self.assertEqual(calls, ['command'])
+        self.assertIn('core.tests.flaky: выполнений', out.getvalue())
+
+    @override_settings(TASKS_BACKEND='core.tasks.DatabaseBackend')
+    def test_run_tasks_processes_report_stats(self):
+        """Статистика дочерних процессов печатается родителем"""
+        child_stats = {'task': {
+            'runs': 2, 'failures': 1, 'total': 0.2, 'max': 0.15,
+        }}
+        out = StringIO()
+        # Тестовая база SQLite в памяти не видна из других процессов,
+        # поэтому исполнители подменяются потоками без работы с базой.
+        command = 'core.management.commands.run_tasks'
+        with mock.patch(f'{command}.multiprocessing.Process',
+                        threading.Thread), \
+                mock.patch(f'{command}.work') as work, \
+                mock.patch('core.tasks.stats', return_value=child_stats):
+            call_command('run_tasks', '--burst', '--processes=2', stdout=out)
+        self.assertEqual(work.call_count, 2)
+        self.assertEqual(
+            out.getvalue(),
+            'task: выполнений 4, падений 2, в среднем 100.0 мс, '
+            'максимум 150.0 мс\n'
+        )
+
+    def reset_password(self):
+        User.objects.create_user(
+            username='forgetful', email='me@example.com', password='secret'
+        )
+        return Client().post(
+            reverse('users:password_reset'), {'email': 'me@example.com'}
+        )
+
+    @override_settings(TASKS_BACKEND='core.tasks.DatabaseBackend')
+    def test_password_reset_email_queued(self):
+        self.assertRedirects(
+            self.reset_password(), reverse('users:password_reset_done')
+        )
+        self.assertEqual(mail.outbox, [])
+        tasks.work(burst=True)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['me@example.com'])
+        self.assertIn('/auth/reset/', mail.outbox[0].body)
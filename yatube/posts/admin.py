@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from posts.models import Follow, Post, Group, Comment
+from posts.models import Follow, Post, Group, Comment, Profile
 
 
 @admin.register(Group)
@@ -22,7 +22,7 @@ class PostAdmin(admin.ModelAdmin):
         'created',
         'author',
         'group',
-        'comments'
+        'comment_count'
     )
 
     list_editable = ('group',)
@@ -47,3 +47,13 @@ class CommentsAdmin(admin.ModelAdmin):
         'created',
         'author',
     )
+
+
+@admin.register(Profile)
+class ProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        'user',
+        'post_count',
+        'follower_count',
+        'following_count',
+    )
@@ -0,0 +1,301 @@
+"""JSON-версии лент и пакетные подписки.
+
+Ответы поддерживают условные GET. ETag лент строится из версии лент (и
+версии подписок для ленты подписок), которая меняется при любой правке
+и удалении. Last-Modified у лент нет: дата самого свежего поста не
+меняется, когда правят или удаляют посты, и If-Modified-Since отдавал
+бы устаревшую ленту. ETag отдельного поста зависит только от номера его
+правки и состояния его комментариев, поэтому не меняется при правках
+других постов. Декоратор condition отвечает 304 до вызова view, так
+что при совпадении строки ленты не читаются и не сериализуются.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Max
+from django.http import JsonResponse
+from django.views.decorators.http import (
+    condition, require_POST, require_safe
+)
+from django.views.decorators.vary import vary_on_cookie
+
+from posts.feed_cache import feed_version, follow_version
+from posts.follow_graph import change_follows
+from posts.models import Comment, Group, Post, User
+from posts.paginators import CursorPaginator
+from posts.timeline import timeline_posts
+from posts.views import comment_chunk, paginator_function
+
+POST_FIELDS = (
+    'text', 'created', 'image', 'comment_count',
+    'author', 'author__username', 'author__first_name', 'author__last_name',
+    'group', 'group__slug', 'group__title',
+)
+
+
+def _response(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params={
+        'ensure_ascii': False,
+        'separators': (',', ':'),
+    })
+
+
+def _error(status, detail):
+    return _response({'detail': detail}, status=status)
+
+
+def api_login_required(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _error(401, 'Требуется вход')
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _digest(*parts):
+    raw = ':'.join(str(part) for part in parts)
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _etag(request, *parts):
+    return _digest(
+        feed_version(),
+        settings.POSTS_PAGINATION,
+        request.GET.get('page'),
+        *parts
+    )
+
+
+def _user(user):
+    return {
+        'username': user.username,
+        'name': user.get_full_name(),
+    }
+
+
+def _post(post):
+    group = post.group
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'created': post.created.isoformat(),
+        'author': _user(post.author),
+        'group': {
+            'slug': group.slug,
+            'title': group.title,
+        } if group is not None else None,
+        'image': post.image.url if post.image else None,
+        'comments': post.comment_count,
+    }
+
+
+def _comment(comment):
+    return {
+        'id': comment.pk,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+        'author': _user(comment.author),
+    }
+
+
+def _comments(comments):
+    return comments.select_related('author').only(
+        'text', 'created', 'post', 'author', 'author__username',
+        'author__first_name', 'author__last_name',
+    )
+
+
+def _page(posts, request):
+    page = paginator_function(
+        posts.only(*POST_FIELDS), request.GET.get('page')
+    )
+    meta = {
+        'number': page.number,
+        'next': page.next_page_number() if page.has_next() else None,
+        'previous': (
+            page.previous_page_number() if page.has_previous() else None
+        ),
+    }
+    if not isinstance(page.paginator, CursorPaginator):
+        meta['count'] = page.paginator.count
+        meta['pages'] = page.paginator.num_pages
+    return {
+        'results': [_post(post) for post in page],
+        'page': meta,
+    }
+
+
+@require_safe
+@condition(etag_func=lambda request: _etag(request, 'index'))
+def index(request):
+    posts = Post.objects.select_related('author', 'group')
+    return _response(_page(posts, request))
+
+
+@require_safe
+@condition(etag_func=lambda request, slug: _etag(request, 'group', slug))
+def group_posts(request, slug):
+    group = Group.objects.filter(slug=slug).first()
+    if group is None:
+        return _error(404, 'Группа не найдена')
+    posts = group.posts.select_related('author', 'group')
+    data = _page(posts, request)
+    data['group'] = {
+        'slug': group.slug,
+        'title': group.title,
+        'description': group.description,
+    }
+    return _response(data)
+
+
+@require_safe
+@condition(
+    etag_func=lambda request, username: _etag(request, 'profile', username),
+)
+def profile(request, username):
+    author = User.objects.select_related('profile').filter(
+        username=username
+    ).first()
+    if author is None:
+        return _error(404, 'Пользователь не найден')
+    posts = author.posts.select_related('author', 'group')
+    data = _page(posts, request)
+    # Счётчики подписчиков сюда не входят: подписки не меняют ETag.
+    data['author'] = dict(_user(author), posts=author.profile.post_count)
+    return _response(data)
+
+
+def _post_state(request, post_id):
+    """Номер правки поста, его автор и состояние комментариев.
+
+    Читается одним запросом и запоминается на запросе, потому что
+    condition спрашивает ETag и Last-Modified по отдельности.
+    """
+    states = getattr(request, '_post_states', None)
+    if states is None:
+        states = request._post_states = {}
+    if post_id not in states:
+        states[post_id] = Post.objects.filter(pk=post_id).annotate(
+            comments_updated=Max('comments__updated'),
+        ).values(
+            'version', 'updated', 'comment_count', 'comments_updated',
+            'author__username', 'author__first_name', 'author__last_name',
+        ).first()
+    return states[post_id]
+
+
+def _post_etag(request, post_id, name='post'):
+    state = _post_state(request, post_id)
+    if state is None:
+        return None
+    return _digest(
+        request.GET.get('cursor'),
+        request.GET.get('order'),
+        name,
+        post_id,
+        *state.values()
+    )
+
+
+def _post_modified(request, post_id):
+    state = _post_state(request, post_id)
+    if state is None:
+        return None
+    return max(filter(None, (state['updated'], state['comments_updated'])))
+
+
+@require_safe
+@condition(
+    etag_func=_post_etag,
+    last_modified_func=_post_modified,
+)
+def post_detail(request, post_id):
+    post = Post.objects.select_related('author', 'group').only(
+        *POST_FIELDS
+    ).filter(pk=post_id).first()
+    if post is None:
+        return _error(404, 'Пост не найден')
+    comments, comments_next = comment_chunk(
+        _comments(post.comments), request
+    )
+    return _response({
+        'post': _post(post),
+        'comments': [_comment(comment) for comment in comments],
+        'comments_next': comments_next,
+    })
+
+
+@require_safe
+@condition(
+    etag_func=lambda request, post_id: _post_etag(
+        request, post_id, 'comments'
+    ),
+    last_modified_func=_post_modified,
+)
+def post_comments(request, post_id):
+    """Следующая порция комментариев поста по курсору."""
+    comments, comments_next = comment_chunk(
+        _comments(Comment.objects.filter(post_id=post_id)), request
+    )
+    if not comments and _post_state(request, post_id) is None:
+        return _error(404, 'Пост не найден')
+    return _response({
+        'results': [_comment(comment) for comment in comments],
+        'next': comments_next,
+    })
+
+
+@require_safe
+@api_login_required
+@vary_on_cookie
+@condition(
+    etag_func=lambda request: _etag(
+        request, 'follow', request.user.pk, follow_version(request.user.pk)
+    ),
+)
+def follow_index(request):
+    posts = timeline_posts(request.user).select_related('author', 'group')
+    return _response(_page(posts, request))
+
+
+def _usernames(request, field):
+    if request.content_type == 'application/json':
+        values = json.loads(request.body or b'{}').get(field, [])
+    else:
+        values = request.POST.getlist(field)
+    if not isinstance(values, list) or not all(
+        isinstance(value, str) for value in values
+    ):
+        raise ValueError(f'{field}: ожидается список имён пользователей')
+    return values
+
+
+@require_POST
+@api_login_required
+def follow_bulk(request):
+    """Подписка и отписка пачкой: поля follow и unfollow, списки имён."""
+    try:
+        follow = _usernames(request, 'follow')
+        unfollow = _usernames(request, 'unfollow')
+    except (ValueError, AttributeError):
+        return _error(400, 'Ожидаются списки follow и unfollow')
+    if len(follow) + len(unfollow) > settings.FOLLOW_BULK_LIMIT:
+        return _error(
+            400, f'Не больше {settings.FOLLOW_BULK_LIMIT} авторов за раз'
+        )
+    ids = dict(User.objects.filter(
+        username__in=follow + unfollow
+    ).values_list('username', 'pk'))
+    followed, unfollowed = change_follows(
+        request.user,
+        follow=[ids[name] for name in follow if name in ids],
+        unfollow=[ids[name] for name in unfollow if name in ids],
+    )
+    return _response({
+        'followed': followed,
+        'unfollowed': unfollowed,
+        'unknown': sorted(set(follow + unfollow) - ids.keys()),
+    })
@@ -0,0 +1,288 @@
+"""Синтетические данные и замеры лент.
+
+generate() наполняет базу пользователями, группами, постами,
+комментариями и подписками, run() меряет задержки и число запросов
+view и сохраняет результат в JSON для сравнения между коммитами.
+"""
+import json
+import os
+import random
+import statistics
+import subprocess
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from faker import Faker
+
+from core.db import bulk_insert
+from posts import counters, search, timeline
+from posts.models import Comment, Follow, Group, Post, User
+
+SCALES = {
+    'small': 10_000,
+    'medium': 100_000,
+    'large': 1_000_000,
+    'huge': 10_000_000,
+}
+
+PERCENTILES = (50, 90, 99)
+
+
+def default_sizes(posts):
+    users = max(posts // 20, 10)
+    return {
+        'users': users,
+        'groups': max(users // 100, 1),
+        'posts': posts,
+        'comments': posts * 2,
+        'follows_per_user': 20,
+    }
+
+
+class Generator:
+    SENTENCES = 1000
+    PERIOD = timedelta(days=365)
+
+    def __init__(self, seed=0, batch_size=10_000, log=None):
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        fake = Faker('ru_RU')
+        fake.seed_instance(seed)
+        self.sentences = [fake.sentence() for _ in range(self.SENTENCES)]
+        self.now = timezone.now()
+
+    def _text(self):
+        return ' '.join(self.random.choices(self.sentences, k=3))
+
+    def _created(self):
+        return self.now - self.PERIOD * self.random.random()
+
+    def _batches(self, total, make):
+        for start in range(0, total, self.batch_size):
+            size = min(self.batch_size, total - start)
+            yield [make(start + num) for num in range(size)]
+
+    def _popular(self, ids):
+        # Популярность авторов распределена по закону Ципфа.
+        cum_weights = list(accumulate(
+            1 / rank for rank in range(1, len(ids) + 1)
+        ))
+        return lambda: self.random.choices(ids, cum_weights=cum_weights)[0]
+
+    def users(self, total):
+        prefix = f'bench{int(self.now.timestamp())}'
+        for batch in self._batches(total, lambda num: User(
+            username=f'{prefix}_{num}',
+            first_name=f'Имя{num}',
+            last_name=f'Фамилия{num}',
+        )):
+            User.objects.bulk_create(batch)
+        self.log(f'Пользователей: {total}')
+        return list(User.objects.filter(
+            username__startswith=f'{prefix}_'
+        ).values_list('pk', flat=True))
+
+    def groups(self, total):
+        prefix = f'bench{int(self.now.timestamp())}'
+        for batch in self._batches(total, lambda num: Group(
+            title=f'Группа {num}',
+            slug=f'{prefix}-{num}',
+            description=self._text(),
+        )):
+            Group.objects.bulk_create(batch)
+        self.log(f'Групп: {total}')
+        return list(Group.objects.filter(
+            slug__startswith=f'{prefix}-'
+        ).values_list('pk', flat=True))
+
+    def posts(self, total, user_ids, group_ids):
+        author = self._popular(user_ids)
+        for batch in self._batches(total, lambda num: Post(
+            text=self._text(),
+            author_id=author(),
+            group_id=(
+                self.random.choice(group_ids)
+                if self.random.random() < 0.7 else None
+            ),
+            created=self._created(),
+        )):
+            bulk_insert(Post, batch)
+        self.log(f'Постов: {total}')
+
+    def comments(self, total, user_ids):
+        first = Post.objects.order_by('pk').values_list('pk', flat=True)
+        last = Post.objects.order_by('-pk').values_list('pk', flat=True)
+        low, high = first.first(), last.first()
+        if low is None:
+            return
+        for batch in self._batches(total, lambda num: Comment(
+            text=self.random.choice(self.sentences),
+            author_id=self.random.choice(user_ids),
+            post_id=self.random.randint(low, high),
+            created=self._created(),
+        )):
+            existing = set(Post.objects.filter(
+                pk__in={comment.post_id for comment in batch}
+            ).values_list('pk', flat=True))
+            bulk_insert(Comment, (
+                comment for comment in batch
+                if comment.post_id in existing
+            ))
+        self.log(f'Комментариев: до {total}')
+
+    def follows(self, per_user, user_ids):
+        def make(num):
+            return Follow(
+                user_id=user_ids[num // per_user],
+                author_id=author()
+            )
+
+        author = self._popular(user_ids)
+        for batch in self._batches(per_user * len(user_ids), make):
+            Follow.objects.bulk_create(
+                (follow for follow in batch
+                 if follow.user_id != follow.author_id),
+                ignore_conflicts=True
+            )
+        self.log(f'Подписок: до {per_user * len(user_ids)}')
+
+    def generate(self, users, groups, posts, comments, follows_per_user):
+        user_ids = self.users(users)
+        group_ids = self.groups(groups)
+        self.posts(posts, user_ids, group_ids)
+        self.comments(comments, user_ids)
+        self.follows(follows_per_user, user_ids)
+        # bulk_create обходит сигналы, поэтому производные данные
+        # пересобираются целиком.
+        counters.recount_profiles()
+        counters.recount_posts()
+        counters.recount_groups()
+        timeline.rebuild()
+        search.get_backend().rebuild()
+        self.log('Счётчики, ленты подписок и поисковый индекс пересобраны')
+
+
+def targets():
+    """Самые тяжёлые объекты для каждой ленты."""
+    group = Group.objects.order_by('-post_count').first()
+    author = User.objects.order_by('-profile__follower_count').first()
+    reader = User.objects.order_by('-profile__following_count').first()
+    post = Post.objects.order_by('-comment_count').first()
+    if None in (group, author, reader, post):
+        raise ValueError('В базе нет данных для замеров')
+    return reader, {
+        'index': reverse('posts:index'),
+        'group_posts': reverse('posts:group_list', args=[group.slug]),
+        'profile': reverse('posts:profile', args=[author.username]),
+        'post_detail': reverse('posts:post_detail', args=[post.pk]),
+        'follow_index': reverse('posts:follow_index'),
+    }
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    index = round(percent / 100 * (len(ordered) - 1))
+    return ordered[index]
+
+
+def _summary(durations, queries):
+    result = {
+        'min': min(durations),
+        'max': max(durations),
+        'mean': statistics.mean(durations),
+        'queries': max(queries),
+    }
+    for percent in PERCENTILES:
+        result[f'p{percent}'] = _percentile(durations, percent)
+    return result
+
+
+def run(iterations=20, warmup=2, page=None, warm_cache=False):
+    """Замеряет ленты, время в миллисекундах."""
+    reader, urls = targets()
+    client = Client()
+    client.force_login(reader)
+    params = {'page': page} if page else {}
+    results = {}
+    for name, url in urls.items():
+        durations, queries = [], []
+        for iteration in range(warmup + iterations):
+            if not warm_cache:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.get(url, params)
+                duration = (time.perf_counter() - start) * 1000
+            if response.status_code != 200:
+                raise ValueError(f'{url}: ответ {response.status_code}')
+            if iteration >= warmup:
+                durations.append(duration)
+                queries.append(len(captured))
+        results[name] = _summary(durations, queries)
+    return {
+        'commit': _commit(),
+        'created': timezone.now().isoformat(),
+        'dataset': {
+            'users': User.objects.count(),
+            'posts': Post.objects.count(),
+            'comments': Comment.objects.count(),
+            'follows': Follow.objects.count(),
+        },
+        'options': {
+            'iterations': iterations,
+            'page': page,
+            'warm_cache': warm_cache,
+            'pagination': settings.POSTS_PAGINATION,
+        },
+        'results': results,
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def save(report):
+    os.makedirs(settings.BENCHMARK_DIR, exist_ok=True)
+    stamp = report['created'][:19].replace(':', '-')
+    path = os.path.join(
+        settings.BENCHMARK_DIR, f'{stamp}-{report["commit"]}.json'
+    )
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+    return path
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(baseline, report, metric='p50'):
+    """Относительное изменение метрики по каждой ленте, в процентах."""
+    changes = {}
+    for name, current in report['results'].items():
+        previous = baseline['results'].get(name)
+        if previous and previous[metric]:
+            changes[name] = (
+                (current[metric] - previous[metric]) / previous[metric] * 100
+            )
+    return changes
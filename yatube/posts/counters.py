@@ -0,0 +1,109 @@
+"""Денормализованные счётчики постов, подписок и комментариев."""
+from itertools import islice
+
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Follow, Group, Post, Profile, User
+
+BATCH_SIZE = 1000
+
+
+def _change(queryset, field, delta):
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def _count(model, field, outer_ref):
+    totals = model.objects.filter(
+        **{field: OuterRef(outer_ref)}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(totals), 0)
+
+
+def change_profile(user_id, field, delta):
+    profiles = Profile.objects.filter(user_id=user_id)
+    if not _change(profiles, field, delta) and not profiles.exists():
+        recount_profiles(user_ids=[user_id])
+
+
+def change_profiles(user_ids, field, delta):
+    """change_profile для многих пользователей одним UPDATE."""
+    user_ids = set(user_ids)
+    profiles = Profile.objects.filter(user_id__in=user_ids)
+    if _change(profiles, field, delta) < len(user_ids):
+        missing = user_ids - set(profiles.values_list('user_id', flat=True))
+        if missing:
+            recount_profiles(user_ids=missing)
+
+
+def change_comment_count(post_id, delta):
+    _change(Post.objects.filter(pk=post_id), 'comment_count', delta)
+
+
+def _last_post_at():
+    return Subquery(Post.objects.filter(
+        group=OuterRef('pk')
+    ).order_by('-created').values('created')[:1])
+
+
+def change_group(group_id, delta, created):
+    """Меняет число записей группы на delta.
+
+    created — дата добавленной или убранной записи. Дата последней
+    записи пересчитывается по индексу постов группы, только если
+    убрана самая свежая запись.
+    """
+    groups = Group.objects.filter(pk=group_id)
+    _change(groups, 'post_count', delta)
+    if delta > 0:
+        groups.filter(
+            Q(last_post_at__isnull=True) | Q(last_post_at__lt=created)
+        ).update(last_post_at=created)
+    else:
+        groups.filter(last_post_at__lte=created).update(
+            last_post_at=_last_post_at()
+        )
+
+
+def create_missing_profiles(user_ids=None):
+    users = User.objects.filter(profile__isnull=True)
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    missing = users.values_list('pk', flat=True).iterator()
+    created = 0
+    while True:
+        batch = [Profile(user_id=pk) for pk in islice(missing, BATCH_SIZE)]
+        if not batch:
+            return created
+        Profile.objects.bulk_create(batch, ignore_conflicts=True)
+        created += len(batch)
+
+
+def recount_profiles(user_ids=None):
+    """Пересчитывает счётчики пользователей одним UPDATE."""
+    create_missing_profiles(user_ids)
+    profiles = Profile.objects.all()
+    if user_ids is not None:
+        profiles = profiles.filter(user_id__in=user_ids)
+    return profiles.update(
+        post_count=_count(Post, 'author', 'user'),
+        follower_count=_count(Follow, 'author', 'user'),
+        following_count=_count(Follow, 'user', 'user'),
+    )
+
+
+def recount_groups():
+    """Пересчитывает число и дату последней записи групп одним UPDATE."""
+    return Group.objects.update(
+        post_count=_count(Post, 'group', 'pk'),
+        last_post_at=_last_post_at(),
+    )
+
+
+def recount_posts():
+    """Пересчитывает количество комментариев у постов одним UPDATE."""
+    return Post.objects.update(
+        comment_count=_count(Comment, 'post', 'pk')
+    )
@@ -0,0 +1,89 @@
+"""Версионированный кеш фрагментов лент.
+
+Ключ фрагмента содержит номер версии, который увеличивается при
+любом изменении постов и комментариев, поэтому устаревшие фрагменты
+просто перестают читаться и TTL можно держать большим.
+
+Разметка отдельного поста кешируется независимо от ленты: ключ
+строится из id поста и номера его правки, поэтому один и тот же
+фрагмент переиспользуется всеми лентами, где встречается пост.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+FEED_VERSION_KEY = 'posts:feed_version'
+FOLLOW_VERSION_KEY = 'posts:follow_version:{}'
+TRENDING_VERSION_KEY = 'posts:trending_version'
+
+
+def _initial_version():
+    # Если ключ версии вытеснен из кеша, новая версия не совпадёт
+    # ни с одной из выданных ранее.
+    return int(time.time() * 1000)
+
+
+def _version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), None)
+
+
+def feed_version():
+    return _version(FEED_VERSION_KEY)
+
+
+def bump_feed_version():
+    _bump(FEED_VERSION_KEY)
+
+
+def follow_version(user_id):
+    """Версия подписок пользователя, меняется при подписке и отписке."""
+    return _version(FOLLOW_VERSION_KEY.format(user_id))
+
+
+def bump_follow_version(user_id):
+    _bump(FOLLOW_VERSION_KEY.format(user_id))
+
+
+def trending_version():
+    """Версия оценок популярности, меняется после каждого расчёта."""
+    return _version(TRENDING_VERSION_KEY)
+
+
+def bump_trending_version():
+    _bump(TRENDING_VERSION_KEY)
+
+
+def feed_cache(name, *vary_on):
+    """Параметры тега feedcache для ленты или None, если кеш выключен."""
+    if not settings.FEED_CACHE_ENABLED:
+        return None
+    parts = (name, feed_version()) + vary_on
+    return {
+        'timeout': settings.FEED_CACHE_TIMEOUT,
+        'key': ':'.join(str(part) for part in parts),
+    }
+
+
+def post_cache(post):
+    """Параметры тега postcache для поста или None, если кеш выключен."""
+    if not settings.FEED_CACHE_ENABLED:
+        return None
+    # Правка поста меняет version, смена имени автора — его часть ключа.
+    author = post.author
+    parts = (post.pk, post.version, author.username, author.get_full_name())
+    return {
+        'timeout': settings.POST_CACHE_TIMEOUT,
+        'key': ':'.join(str(part) for part in parts),
+    }
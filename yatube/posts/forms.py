@@ -1,5 +1,6 @@
 from django import forms
 
+from posts import images
 from posts.models import Group, Post, Comment
 
 
@@ -9,6 +10,13 @@ class PostForm(forms.ModelForm):
 
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        # У уже сохранённой картинки поста нет атрибута image.
+        if image and hasattr(image, 'image'):
+            images.validate(image)
+        return image
+
 
 class GroupForm(forms.ModelForm):
     class Meta:
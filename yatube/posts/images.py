@@ -0,0 +1,205 @@
+"""Обработка загруженных картинок постов.
+
+Форма проверяет размер файла и разрешение по заголовку картинки, не
+декодируя её целиком. После сохранения поста оригинал в фоне
+пересжимается задачей process (см. core.tasks): поворот по EXIF,
+уменьшение до POST_IMAGE_MAX_SIZE по длинной стороне, запись в
+POST_IMAGE_FORMAT без метаданных во временный файл. Готовый файл
+кладётся в PROCESSED_DIR в одной транзакции с UPDATE, который
+переключает на него пост, а оригинал удаляется. Картинки вне
+PROCESSED_DIR, в том числе загруженные до появления обработки,
+пересжимаются при следующем сохранении поста.
+
+Одинаковые файлы хранятся один раз (см. posts.storage), поэтому
+удалять файл можно, только когда на него не ссылается ни один пост.
+ImageRef хранит число ссылок, его меняют сигналы поста и _apply().
+Файл без ссылок удаляется вместе с миниатюрами после фиксации
+транзакции. Хранилище перед проверкой файла и discard() перед его
+удалением блокируют строку ImageRef (см. hold()), поэтому загрузка
+того же файла либо дождётся удаления и запишет файл заново, либо
+успеет сослаться на него, и discard() его не тронет.
+"""
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from core.tasks import task
+from posts import thumbnails
+from posts.feed_cache import bump_feed_version
+from posts.models import ImageRef, Post
+
+logger = logging.getLogger(__name__)
+
+PROCESSED_DIR = 'posts/processed/'
+EXTENSIONS = {'JPEG': '.jpg', 'WEBP': '.webp'}
+
+
+def validate(upload):
+    """Проверяет загрузку по размеру файла и разрешению из заголовка."""
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)s',
+            params={'limit': filesizeformat(settings.POST_IMAGE_MAX_BYTES)},
+            code='image_too_large',
+        )
+    # forms.ImageField уже открыл картинку: PIL прочитал только заголовок.
+    width, height = upload.image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Разрешение картинки слишком большое',
+            code='image_too_many_pixels',
+        )
+
+
+def _storage():
+    return Post._meta.get_field('image').storage
+
+
+def hold(name):
+    """Создаёт строку ImageRef файла и блокирует её до конца транзакции.
+
+    Пустой UPDATE берёт блокировку строки на PostgreSQL, а на SQLite
+    вставка и UPDATE берут блокировку записи всей базы. Вне транзакции
+    блокировка сразу снимается, поэтому такой вызов — ошибка.
+    """
+    if not connection.in_atomic_block:
+        raise transaction.TransactionManagementError(
+            'hold() блокирует строку только внутри транзакции'
+        )
+    ImageRef.objects.bulk_create([ImageRef(name=name)], ignore_conflicts=True)
+    ImageRef.objects.filter(name=name).update(refs=F('refs'))
+
+
+def discard(name):
+    """Удаляет файл и его миниатюры, если на файл никто не ссылается."""
+    with transaction.atomic():
+        hold(name)
+        if ImageRef.objects.filter(name=name, refs__gt=0).exists():
+            return
+        ImageRef.objects.filter(name=name).delete()
+        # Уборка файлов не должна ломать удаление поста.
+        try:
+            default.backend.delete(ImageFile(name, _storage()))
+        except Exception:
+            logger.exception('Не удалось удалить картинку %s', name)
+
+
+def change_refs(acquire='', release=''):
+    """Добавляет ссылку на файл acquire и снимает ссылку с release.
+
+    Строка файла без ссылок остаётся до discard(), который удаляет её
+    вместе с файлом.
+    """
+    if acquire == release:
+        return
+    if acquire:
+        ImageRef.objects.bulk_create(
+            [ImageRef(name=acquire)], ignore_conflicts=True
+        )
+        ImageRef.objects.filter(name=acquire).update(refs=F('refs') + 1)
+    if release:
+        ImageRef.objects.filter(name=release, refs__gt=0).update(
+            refs=F('refs') - 1
+        )
+        if ImageRef.objects.filter(name=release, refs=0).exists():
+            transaction.on_commit(lambda: discard(release))
+
+
+@transaction.atomic
+def recount_refs():
+    """Пересчитывает ссылки на файлы по постам."""
+    ImageRef.objects.all().delete()
+    counts = Post.objects.exclude(image='').exclude(image=None).values(
+        'image'
+    ).annotate(refs=Count('pk')).order_by()
+    ImageRef.objects.bulk_create(
+        ImageRef(name=row['image'], refs=row['refs']) for row in counts
+    )
+
+
+def needs_processing(image):
+    return bool(image) and not image.name.startswith(PROCESSED_DIR)
+
+
+def _format():
+    image_format = settings.POST_IMAGE_FORMAT
+    if image_format == 'WEBP' and not features.check('webp'):
+        logger.warning('Pillow собран без WebP, картинки пишутся в JPEG')
+        return 'JPEG'
+    return image_format
+
+
+def _reencode(name):
+    """Пересжимает картинку из хранилища во временный файл."""
+    max_size = (settings.POST_IMAGE_MAX_SIZE,) * 2
+    image_format = _format()
+    with _storage().open(name, 'rb') as source:
+        image = Image.open(source)
+        # JPEG декодируется сразу в уменьшенном масштабе.
+        image.draft('RGB', max_size)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(max_size, Image.LANCZOS)
+        if image_format == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+        descriptor, path = tempfile.mkstemp(suffix=EXTENSIONS[image_format])
+        with os.fdopen(descriptor, 'wb') as output:
+            # Метаданные не передаются, поэтому EXIF не сохраняется.
+            image.save(
+                output, image_format, quality=settings.POST_IMAGE_QUALITY
+            )
+    return path
+
+
+def _apply(post_id, original, path):
+    """Кладёт пересжатый файл в хранилище и переключает на него пост,
+    если картинку поста ещё не заменили."""
+    stem = os.path.splitext(os.path.basename(original))[0]
+    try:
+        with transaction.atomic():
+            # Файл сохраняется в той же транзакции, что и ссылка на
+            # него, поэтому discard() не удалит его в промежутке.
+            with open(path, 'rb') as output:
+                processed = _storage().save(
+                    PROCESSED_DIR + stem + os.path.splitext(path)[1],
+                    File(output),
+                )
+            updated = Post.objects.filter(pk=post_id, image=original).update(
+                image=processed,
+                version=F('version') + 1,
+                updated=timezone.now(),
+            )
+            if not updated:
+                # Такой же файл может быть у другого поста.
+                transaction.on_commit(lambda: discard(processed))
+                return
+            change_refs(acquire=processed, release=original)
+    finally:
+        os.remove(path)
+    bump_feed_version()
+    thumbnails.prerender(Post.objects.get(pk=post_id).image)
+
+
+@task
+def process(post_id, name):
+    """Пересжимает картинку поста."""
+    _apply(post_id, name, _reencode(name))
+
+
+def process_later(post):
+    """Ставит картинку поста в очередь задач после фиксации транзакции."""
+    post_id, name = post.pk, post.image.name
+    if settings.POST_IMAGES_IN_TASKS:
+        process.delay(post_id, name)
+    else:
+        transaction.on_commit(lambda: process(post_id, name))
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Замеряет задержки и число запросов лент'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--page', help='Страница или курсор лент')
+        parser.add_argument(
+            '--warm-cache', action='store_true',
+            help='Не очищать кеш между запросами'
+        )
+        parser.add_argument(
+            '--compare', metavar='PATH',
+            help='Сравнить с сохранённым результатом'
+        )
+        parser.add_argument(
+            '--fail-over', type=float, metavar='PERCENT',
+            help='Завершиться с ошибкой, если p50 вырос больше, чем на PERCENT'
+        )
+        parser.add_argument(
+            '--no-save', action='store_true',
+            help='Не сохранять результат в BENCHMARK_DIR'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            report = benchmark.run(
+                iterations=options['iterations'],
+                warmup=options['warmup'],
+                page=options['page'],
+                warm_cache=options['warm_cache'],
+            )
+        except ValueError as error:
+            raise CommandError(error)
+
+        self.stdout.write(
+            f'{"view":<14}{"p50":>9}{"p90":>9}{"p99":>9}{"queries":>9}'
+        )
+        for name, result in report['results'].items():
+            self.stdout.write(
+                f'{name:<14}{result["p50"]:>9.2f}{result["p90"]:>9.2f}'
+                f'{result["p99"]:>9.2f}{result["queries"]:>9}'
+            )
+        if not options['no_save']:
+            path = benchmark.save(report)
+            self.stdout.write(f'Результат сохранён в {path}')
+
+        if options['compare']:
+            baseline = benchmark.load(options['compare'])
+            changes = benchmark.compare(baseline, report)
+            self.stdout.write(
+                f'Изменение p50 относительно {baseline["commit"]}:'
+            )
+            for name, change in changes.items():
+                self.stdout.write(f'{name:<14}{change:>+9.1f}%')
+            regressions = [
+                name for name, change in changes.items()
+                if options['fail_over'] is not None
+                and change > options['fail_over']
+            ]
+            if regressions:
+                raise CommandError(
+                    f'Регрессия p50 в лентах: {", ".join(regressions)}'
+                )
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.suggestions import build
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рекомендации «на кого подписаться»'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k', type=int, default=settings.SUGGESTIONS_TOP_K,
+            help='Сколько кандидатов хранить на пользователя',
+        )
+
+    def handle(self, *args, **options):
+        total = build(options['top_k'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Сохранено рекомендаций: {total}'
+        ))
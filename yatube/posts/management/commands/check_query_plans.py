@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import query_plans
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN для запросов лент и завершается с ошибкой, '
+        'если какой-то из них читает таблицу целиком или сортирует '
+        'во временном B-дереве'
+    )
+
+    def handle(self, *args, **options):
+        try:
+            results = query_plans.check()
+        except ValueError as error:
+            raise CommandError(error)
+
+        failed = [result for result in results if result['problems']]
+        for result in results:
+            if not result['problems'] and options['verbosity'] < 2:
+                continue
+            status = ', '.join(result['problems']) or 'ok'
+            self.stdout.write(
+                f'{result["feed"]} ({result["pagination"]}): {status}'
+            )
+            self.stdout.write(f'  {result["sql"]}')
+            for line in result['plan']:
+                self.stdout.write(f'    {line}')
+
+        if failed:
+            raise CommandError(
+                f'Проблемные планы у {len(failed)} из {len(results)} запросов'
+            )
+        self.stdout.write(f'Планы {len(results)} запросов в порядке')
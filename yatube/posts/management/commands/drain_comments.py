@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.comment_queue import drain
+
+
+class Command(BaseCommand):
+    help = 'Переносит комментарии из очереди отложенной записи'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.COMMENTS_QUEUE_BATCH,
+            help='Сколько комментариев вставлять за раз',
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Не завершаться, а ждать новых комментариев',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            drained = drain(options['batch_size'])
+            total += drained
+            if drained:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(settings.COMMENTS_QUEUE_INTERVAL)
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено комментариев: {total}'
+        ))
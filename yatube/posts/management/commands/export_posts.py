@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Выгружает группы, посты, комментарии и подписки в NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл, .gz для сжатия или - для stdout'
+        )
+        parser.add_argument(
+            '--models', nargs='+', choices=transfer.MODELS,
+            default=transfer.MODELS,
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        records = transfer.export(
+            models=options['models'], batch_size=options['batch_size']
+        )
+        with transfer.open_stream(options['path'], 'w') as file:
+            count = transfer.dump(records, file)
+        self.stderr.write(f'Выгружено записей: {count}')
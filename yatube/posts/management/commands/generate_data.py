@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.benchmark import SCALES, Generator, default_sizes
+
+
+class Command(BaseCommand):
+    help = 'Наполняет базу синтетическими данными для замеров'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', choices=SCALES, default='small',
+            help='Набор размеров: от 10 тысяч до 10 миллионов постов'
+        )
+        for name in default_sizes(0):
+            parser.add_argument(
+                f'--{name.replace("_", "-")}', type=int, dest=name,
+                help='Переопределяет размер из --scale'
+            )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        sizes = default_sizes(SCALES[options['scale']])
+        for name in sizes:
+            if options[name] is not None:
+                sizes[name] = options[name]
+        generator = Generator(
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+        )
+        with transaction.atomic():
+            generator.generate(**sizes)
+        self.stdout.write(self.style.SUCCESS('Данные сгенерированы'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Загружает NDJSON из export_posts пачками через bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл, .gz или - для stdin'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--no-rebuild', action='store_true',
+            help='Не пересобирать счётчики, ленты и поисковый индекс'
+        )
+
+    def handle(self, *args, **options):
+        importer = transfer.Importer(
+            batch_size=options['batch_size'], log=self.stderr.write
+        )
+        try:
+            with transaction.atomic():
+                with transfer.open_stream(options['path'], 'r') as file:
+                    stats = importer.load(file)
+                if not options['no_rebuild']:
+                    transfer.rebuild_derived()
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(
+            'Загружено: ' + ', '.join(
+                f'{model} {count}' for model, count in stats.items()
+            )
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import recount_groups, recount_posts, recount_profiles
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики постов, профилей и групп'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            profiles = recount_profiles()
+            posts = recount_posts()
+            groups = recount_groups()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано профилей: {profiles}, постов: {posts}, '
+            f'групп: {groups}'
+        ))
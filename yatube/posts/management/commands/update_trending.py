@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.trending import update
+
+
+class Command(BaseCommand):
+    help = 'Учитывает новые события в оценках популярных постов и групп'
+
+    def handle(self, *args, **options):
+        posts = update()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлены оценки постов: {len(posts)}'
+        ))
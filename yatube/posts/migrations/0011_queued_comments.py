@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0010_group_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedComment',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.TextField(max_length=400, verbose_name='Комментарий')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор комментария')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Комментарий в очереди',
+                'verbose_name_plural': 'Комментарии в очереди',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='queuedcomment',
+            index=models.Index(fields=['post', 'author'], name='queued_comment_post_author'),
+        ),
+    ]
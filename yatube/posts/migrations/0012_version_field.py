@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:13
+
+import core.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_queued_comments'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='version',
+            field=core.models.VersionField(default=1, editable=False, verbose_name='Номер правки'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='version',
+            field=core.models.VersionField(default=1, editable=False, verbose_name='Номер правки'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:55
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_timeline_created'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='queuedcomment',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата отправки'),
+        ),
+    ]
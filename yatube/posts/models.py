@@ -1,7 +1,9 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
-from core.models import CreateModel
+from core.models import VersionedModel
+from posts.storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -22,6 +24,25 @@ class Group(models.Model):
         verbose_name='Описание:',
         help_text='Опишите вашу группу:'
     )
+    post_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество записей',
+    )
+    last_post_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Дата последней записи',
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['-last_post_at', '-id'],
+                name='group_activity_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -40,6 +61,11 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Автор'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата подписки'
+    )
 
     class Meta:
         constraints = [
@@ -52,9 +78,43 @@ class Follow(models.Model):
                 name='check_user'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
 
 
-class Post(CreateModel):
+class Profile(models.Model):
+    user = models.OneToOneField(
+        User,
+        related_name='profile',
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    post_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество постов'
+    )
+    follower_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписок'
+    )
+
+    class Meta:
+        verbose_name = 'Профиль'
+        verbose_name_plural = 'Профили'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class Post(VersionedModel):
     FIRST_FIFTEEN_SIMBOLS = 15
     text = models.TextField(
         verbose_name='Что у вас нового?',
@@ -80,19 +140,44 @@ class Post(CreateModel):
         verbose_name='картинка',
         help_text='Загрузите картинку',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
         null=True,
     )
+    fanned_out = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Разослан в ленты подписчиков',
+    )
+    comment_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев',
+    )
 
-    class Meta(CreateModel.Meta):
+    class Meta(VersionedModel.Meta):
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['fanned_out', '-created', '-id'],
+                name='post_fanned_out_created_idx'
+            ),
+            models.Index(
+                fields=['author', '-created', '-id'],
+                name='post_author_created_idx'
+            ),
+            models.Index(
+                fields=['group', '-created', '-id'],
+                name='post_group_created_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:self.FIRST_FIFTEEN_SIMBOLS]
 
 
-class Comment(CreateModel):
+class Comment(VersionedModel):
     text = models.TextField(
         'Комментарий',
         max_length=400
@@ -110,6 +195,172 @@ class Comment(CreateModel):
         on_delete=models.CASCADE
     )
 
-    class Meta(CreateModel.Meta):
+    class Meta(VersionedModel.Meta):
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Коментарии'
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx'
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        related_name='timeline',
+        on_delete=models.CASCADE,
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        related_name='timeline',
+        on_delete=models.CASCADE,
+        verbose_name='Пост'
+    )
+    # Копия даты поста: страница ленты читается по индексу записей
+    # в нужном порядке, без сортировки.
+    created = models.DateTimeField(
+        verbose_name='Дата создания поста'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created', '-post'],
+                name='timeline_user_created_idx'
+            ),
+        ]
+
+
+class ImageRef(models.Model):
+    """Число постов, ссылающихся на файл картинки."""
+    name = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name='Файл',
+    )
+    refs = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число ссылок',
+    )
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return self.name
+
+
+class Suggestion(models.Model):
+    """Кандидат в подписки, рассчитанный posts.suggestions.build()."""
+    user = models.ForeignKey(
+        User,
+        related_name='suggestions',
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    candidate = models.ForeignKey(
+        User,
+        related_name='suggested_to',
+        on_delete=models.CASCADE,
+        verbose_name='Кого предложить'
+    )
+    rank = models.PositiveSmallIntegerField(verbose_name='Место')
+    score = models.FloatField(verbose_name='Оценка')
+
+    class Meta:
+        verbose_name = 'Рекомендация подписки'
+        verbose_name_plural = 'Рекомендации подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'rank'],
+                name='unique_suggestion_rank'
+            ),
+        ]
+
+
+class TrendingPost(models.Model):
+    """Затухающая оценка активности поста, см. posts.trending."""
+    post = models.OneToOneField(
+        Post,
+        primary_key=True,
+        related_name='trending',
+        on_delete=models.CASCADE,
+        verbose_name='Пост'
+    )
+    score = models.FloatField(db_index=True, verbose_name='Оценка')
+
+    class Meta:
+        verbose_name = 'Популярный пост'
+        verbose_name_plural = 'Популярные посты'
+
+
+class TrendingGroup(models.Model):
+    """Затухающая оценка активности группы, см. posts.trending."""
+    group = models.OneToOneField(
+        Group,
+        primary_key=True,
+        related_name='trending',
+        on_delete=models.CASCADE,
+        verbose_name='Группа'
+    )
+    score = models.FloatField(db_index=True, verbose_name='Оценка')
+
+    class Meta:
+        verbose_name = 'Популярная группа'
+        verbose_name_plural = 'Популярные группы'
+
+
+class TrendingRun(models.Model):
+    """Граница событий, уже учтённых в оценках популярности."""
+    until = models.DateTimeField(verbose_name='События учтены по')
+
+    class Meta:
+        verbose_name = 'Расчёт популярности'
+        verbose_name_plural = 'Расчёты популярности'
+
+
+class QueuedComment(models.Model):
+    """Комментарий, принятый в режиме COMMENTS_WRITE_BEHIND.
+
+    Пачками переносится в Comment командой drain_comments, см.
+    posts.comment_queue.
+    """
+    post = models.ForeignKey(
+        Post,
+        related_name='+',
+        on_delete=models.CASCADE,
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE,
+        verbose_name='Автор комментария'
+    )
+    text = models.TextField('Комментарий', max_length=400)
+    created = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Дата отправки'
+    )
+
+    class Meta:
+        verbose_name = 'Комментарий в очереди'
+        verbose_name_plural = 'Комментарии в очереди'
+        indexes = [
+            models.Index(
+                fields=['post', 'author'],
+                name='queued_comment_post_author'
+            ),
+        ]
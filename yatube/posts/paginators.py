@@ -0,0 +1,182 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+
+def key_after(created, pk, descending, fields=('created', 'pk')):
+    """Условие «после ключа (created, pk)» по полям fields."""
+    created_field, pk_field = fields
+    lookup = 'lt' if descending else 'gt'
+    return Q(**{f'{created_field}__{lookup}': created}) | Q(**{
+        created_field: created,
+        f'{pk_field}__{lookup}': pk,
+    })
+
+
+def _rows(objects, key, descending, limit):
+    """Первые limit строк после ключа (created, pk) в порядке обхода.
+
+    Ленту, которую не выразить одним QuerySet (см.
+    posts.timeline.Timeline), читает её собственный keyset_rows().
+    """
+    keyset_rows = getattr(objects, 'keyset_rows', None)
+    if keyset_rows is not None:
+        return keyset_rows(limit, key, descending)
+    if key is not None:
+        objects = objects.filter(key_after(*key, descending))
+    ordering = ('-created', '-pk') if descending else ('created', 'pk')
+    return list(objects.order_by(*ordering)[:limit])
+
+
+class CursorPage(Page):
+    """Страница курсорного пагинатора.
+
+    Вместо номеров страниц previous_page_number/next_page_number
+    возвращают непрозрачные курсоры, поэтому шаблон пагинатора
+    продолжает работать без изменений.
+    """
+
+    def __init__(self, object_list, number, paginator, previous, following):
+        super().__init__(object_list, number, paginator)
+        self._has_previous = previous
+        self._has_next = following
+
+    def __repr__(self):
+        return f'<Page {self.number}>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def next_page_number(self):
+        return self.paginator.encode(
+            CursorPaginator.NEXT, self.object_list[-1]
+        )
+
+    def previous_page_number(self):
+        return self.paginator.encode(
+            CursorPaginator.PREVIOUS, self.object_list[0]
+        )
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (created, id) без COUNT(*) и OFFSET."""
+    FIRST = '1'
+    LAST = 'last'
+    NEXT = 'n'
+    PREVIOUS = 'p'
+    SEPARATOR = '|'
+
+    @property
+    def num_pages(self):
+        return self.LAST
+
+    @property
+    def page_range(self):
+        return range(0)
+
+    @classmethod
+    def encode(cls, direction, obj):
+        return cls._encode(direction, obj.created, obj.pk)
+
+    @classmethod
+    def _encode(cls, direction, created, pk):
+        raw = cls.SEPARATOR.join((direction, created.isoformat(), str(pk)))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    @classmethod
+    def decode(cls, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(
+                cursor + '=' * (-len(cursor) % 4)
+            ).decode()
+            direction, created, pk = raw.split(cls.SEPARATOR)
+            if direction not in (cls.NEXT, cls.PREVIOUS):
+                return None
+            return direction, datetime.fromisoformat(created), int(pk)
+        except (TypeError, ValueError, binascii.Error):
+            return None
+
+    def page(self, number):
+        return self.get_page(number)
+
+    def get_page(self, cursor):
+        key = None if cursor == self.LAST else self.decode(str(cursor))
+        descending = cursor != self.LAST
+        if key is not None:
+            direction, *key = key
+            descending = direction == self.NEXT
+            # Номер страницы идёт в ключ кеша ленты, поэтому у одного
+            # курсора одна запись.
+            cursor = self._encode(direction, *key)
+        rows = _rows(self.object_list, key, descending, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not descending:
+            rows.reverse()
+
+        if cursor == self.LAST:
+            return CursorPage(rows, self.LAST, self, has_more, False)
+        if key is None:
+            return CursorPage(rows, self.FIRST, self, False, has_more)
+        if not rows:
+            return self.get_page(self.FIRST)
+        if descending:
+            return CursorPage(rows, cursor, self, True, has_more)
+        return CursorPage(rows, cursor, self, has_more, True)
+
+
+def keyset_chunk(queryset, size, cursor=None, oldest_first=False):
+    """Порция строк по ключу (created, id) и курсор следующей порции.
+
+    Курсор хранит и направление обхода, поэтому порядок выбирается
+    только для первой порции. Для битого курсора отдаётся первая.
+    """
+    key = CursorPaginator.decode(cursor) if cursor else None
+    descending = not oldest_first
+    if key is not None:
+        direction, *key = key
+        descending = direction == CursorPaginator.NEXT
+    rows = _rows(queryset, key, descending, size + 1)
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    if descending:
+        return rows, CursorPaginator.encode(CursorPaginator.NEXT, rows[-1])
+    return rows, CursorPaginator.encode(CursorPaginator.PREVIOUS, rows[-1])
+
+
+ELLIPSIS = '…'
+
+
+def elided_page_range(page, on_each_side=3, on_ends=2):
+    """Номера страниц вокруг текущей и по краям, пропуски — ELLIPSIS.
+
+    Повторяет Paginator.get_elided_page_range из Django 3.2. У
+    курсорного пагинатора номеров нет, и COUNT(*) не выполняется.
+    """
+    paginator = page.paginator
+    if isinstance(paginator, CursorPaginator):
+        return []
+    number, num_pages = page.number, paginator.num_pages
+    if num_pages <= (on_each_side + on_ends) * 2:
+        return list(paginator.page_range)
+    pages = []
+    if number > on_each_side + on_ends + 2:
+        pages.extend(range(1, on_ends + 1))
+        pages.append(ELLIPSIS)
+        pages.extend(range(number - on_each_side, number + 1))
+    else:
+        pages.extend(range(1, number + 1))
+    if number < num_pages - on_each_side - on_ends - 1:
+        pages.extend(range(number + 1, number + on_each_side + 1))
+        pages.append(ELLIPSIS)
+        pages.extend(range(num_pages - on_ends + 1, num_pages + 1))
+    else:
+        pages.extend(range(number + 1, num_pages + 1))
+    return pages
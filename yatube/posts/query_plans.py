@@ -0,0 +1,95 @@
+"""Проверка планов запросов лент.
+
+check() открывает ленты тестовым клиентом так же, как benchmark.run(),
+с обычной и с курсорной пагинацией, и выполняет EXPLAIN для каждого
+SELECT, который при этом ушёл в базу. Полный просмотр таблицы и
+сортировка во временном B-дереве считаются проблемой: на больших
+данных такие запросы деградируют первыми. Планы PostgreSQL зависят от
+статистики, поэтому проверять их стоит на реальных данных после ANALYZE.
+"""
+import re
+
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from posts import benchmark
+from posts.models import Post
+from posts.paginators import CursorPaginator
+
+PROBLEMS = {
+    'sqlite': {
+        # SCAN ... USING INDEX идёт по индексу в нужном порядке и с
+        # LIMIT останавливается рано, поэтому проблемой не считается.
+        'scan': re.compile(r'\bSCAN (?:TABLE )?\w+(?: AS \w+)?$'),
+        'sort': re.compile(r'\bUSE TEMP B-TREE FOR\b'),
+    },
+    'postgresql': {
+        'scan': re.compile(r'\bSeq Scan on\b'),
+        'sort': re.compile(r'(?:^|->)\s*Sort\s+\('),
+    },
+}
+
+# Допустимые проблемы по лентам, сейчас исключений нет.
+ALLOWED = {}
+
+
+def _pages():
+    anchor = Post.objects.order_by('-created', '-pk').first()
+    return {
+        'offset': '2',
+        'cursor': CursorPaginator.encode(CursorPaginator.NEXT, anchor),
+    }
+
+
+def explain(sql):
+    prefix = connection.ops.explain_query_prefix()
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}')
+        return [
+            ' '.join(str(column) for column in row)
+            for row in cursor.fetchall()
+        ]
+
+
+def problems(plan, allowed=()):
+    """Названия проблем, найденных в строках плана."""
+    patterns = PROBLEMS[connection.vendor]
+    return sorted({
+        name
+        for line in plan
+        for name, pattern in patterns.items()
+        if name not in allowed and pattern.search(line)
+    })
+
+
+def check():
+    """Планы всех SELECT лент, у каждого список найденных проблем."""
+    if connection.vendor not in PROBLEMS:
+        raise ValueError(f'Планы {connection.vendor} не поддерживаются')
+    reader, urls = benchmark.targets()
+    client = Client()
+    client.force_login(reader)
+    results = []
+    for pagination, page in _pages().items():
+        with override_settings(
+            POSTS_PAGINATION=pagination, FEED_CACHE_ENABLED=False
+        ):
+            for name, url in urls.items():
+                with CaptureQueriesContext(connection) as captured:
+                    response = client.get(url, {'page': page})
+                if response.status_code != 200:
+                    raise ValueError(f'{url}: ответ {response.status_code}')
+                for query in captured:
+                    sql = query['sql']
+                    if not sql.lstrip().upper().startswith('SELECT'):
+                        continue
+                    plan = explain(sql)
+                    results.append({
+                        'feed': name,
+                        'pagination': pagination,
+                        'sql': sql,
+                        'plan': plan,
+                        'problems': problems(plan, ALLOWED.get(name, ())),
+                    })
+    return results
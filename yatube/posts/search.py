@@ -0,0 +1,153 @@
+"""Полнотекстовый поиск по постам.
+
+Бэкенд выбирается настройкой POSTS_SEARCH_BACKEND и обновляется
+сигналами при сохранении и удалении постов.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from posts.models import Post
+
+WORD = re.compile(r'\w+')
+
+
+class SearchResults:
+    """Ленивая выдача для Paginator: считает и читает только нужную страницу.
+    """
+
+    def __init__(self, backend, query):
+        self.backend = backend
+        self.query = query
+
+    def count(self):
+        return self.backend.count(self.query)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        ids = self.backend.ids(self.query, item.start or 0, item.stop)
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+class BaseSearchBackend:
+    def index(self, post):
+        raise NotImplementedError
+
+    def remove(self, post_id):
+        raise NotImplementedError
+
+    def rebuild(self):
+        """Переиндексирует все посты."""
+        raise NotImplementedError
+
+    def count(self, query):
+        raise NotImplementedError
+
+    def ids(self, query, start, stop):
+        """id постов по убыванию релевантности в срезе [start:stop]."""
+        raise NotImplementedError
+
+    def search(self, query):
+        return SearchResults(self, query)
+
+
+class ContainsSearchBackend(BaseSearchBackend):
+    """Поиск через LIKE для баз без полнотекстового индекса."""
+
+    def index(self, post):
+        pass
+
+    def remove(self, post_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def _posts(self, query):
+        words = WORD.findall(query)
+        if not words:
+            return Post.objects.none()
+        posts = Post.objects.all()
+        for word in words:
+            posts = posts.filter(text__icontains=word)
+        return posts
+
+    def count(self, query):
+        return self._posts(query).count()
+
+    def ids(self, query, start, stop):
+        posts = self._posts(query).values_list('pk', flat=True)
+        return list(posts[start:stop])
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """Инвертированный индекс SQLite FTS5 (таблица из миграции 0004)."""
+    TABLE = 'posts_post_fts'
+
+    @staticmethod
+    def match_expression(query):
+        words = WORD.findall(query)
+        if not words:
+            return None
+        # Слова в кавычках не разбираются как операторы FTS5, последнее
+        # слово ищется по префиксу.
+        return ' '.join(f'"{word}"' for word in words) + '*'
+
+    def index(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.TABLE} WHERE rowid = %s', [post.pk]
+            )
+            cursor.execute(
+                f'INSERT INTO {self.TABLE} (rowid, text) VALUES (%s, %s)',
+                [post.pk, post.text]
+            )
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.TABLE} WHERE rowid = %s', [post_id]
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.TABLE}')
+            cursor.execute(
+                f'INSERT INTO {self.TABLE} (rowid, text) '
+                f'SELECT id, text FROM {Post._meta.db_table}'
+            )
+
+    def count(self, query):
+        match = self.match_expression(query)
+        if match is None:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {self.TABLE} '
+                f'WHERE {self.TABLE} MATCH %s',
+                [match]
+            )
+            return cursor.fetchone()[0]
+
+    def ids(self, query, start, stop):
+        match = self.match_expression(query)
+        if match is None:
+            return []
+        limit = -1 if stop is None else stop - start
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {self.TABLE} '
+                f'WHERE {self.TABLE} MATCH %s '
+                f'ORDER BY rank LIMIT %s OFFSET %s',
+                [match, limit, start]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+def get_backend():
+    return import_string(settings.POSTS_SEARCH_BACKEND)()
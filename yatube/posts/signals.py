@@ -0,0 +1,158 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from posts import counters, images, search, thumbnails, timeline
+from posts.feed_cache import bump_feed_version, bump_follow_version
+from posts.models import Comment, Follow, Post, Profile, User
+
+
+@receiver(pre_save, sender=Post)
+def mark_fan_out(sender, instance, raw, **kwargs):
+    if raw or not instance._state.adding:
+        return
+    instance.fanned_out = timeline.is_fan_out_allowed(instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw, **kwargs):
+    if created and not raw and instance.fanned_out:
+        timeline.fan_out(instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_stored(sender, instance, raw, update_fields, **kwargs):
+    """Запоминает сохранённые картинку и группу для пересчёта счётчиков."""
+    fields = [
+        field for field in ('image', 'group_id')
+        if update_fields is None or field.replace('_id', '') in update_fields
+    ]
+    instance._stored = {}
+    if raw or not fields:
+        return
+    if instance._state.adding:
+        instance._stored = dict.fromkeys(fields)
+    else:
+        instance._stored = Post.objects.filter(
+            pk=instance.pk
+        ).values(*fields).first() or dict.fromkeys(fields)
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, **kwargs):
+    if 'image' in instance._stored:
+        images.change_refs(
+            acquire=instance.image.name or '',
+            release=instance._stored['image'] or '',
+        )
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    images.change_refs(release=instance.image.name or '')
+
+
+@receiver(post_save, sender=Post)
+def count_group_posts(sender, instance, **kwargs):
+    if 'group_id' not in instance._stored:
+        return
+    stored = instance._stored['group_id']
+    if stored == instance.group_id:
+        return
+    if stored is not None:
+        counters.change_group(stored, -1, instance.created)
+    if instance.group_id is not None:
+        counters.change_group(instance.group_id, 1, instance.created)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_group_post(sender, instance, **kwargs):
+    if instance.group_id is not None:
+        counters.change_group(instance.group_id, -1, instance.created)
+
+
+@receiver(post_save, sender=Post)
+def prepare_image(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    # Миниатюры пересжатой картинки ставятся в очередь после обработки.
+    if images.needs_processing(instance.image):
+        images.process_later(instance)
+    else:
+        thumbnails.prerender(instance.image)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def drop_timeline(sender, instance, **kwargs):
+    timeline.drop(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_feeds(sender, **kwargs):
+    bump_feed_version()
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_feed(sender, instance, **kwargs):
+    bump_follow_version(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def create_profile(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        Profile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def increment_post_count(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.change_profile(instance.author_id, 'post_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def decrement_post_count(sender, instance, **kwargs):
+    counters.change_profile(instance.author_id, 'post_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def increment_follow_counts(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.change_profile(instance.author_id, 'follower_count', 1)
+        counters.change_profile(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def decrement_follow_counts(sender, instance, **kwargs):
+    counters.change_profile(instance.author_id, 'follower_count', -1)
+    counters.change_profile(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def increment_comment_count(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.change_comment_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, **kwargs):
+    counters.change_comment_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw, **kwargs):
+    if not raw:
+        search.get_backend().index(instance)
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_index(sender, instance, **kwargs):
+    search.get_backend().remove(instance.pk)
@@ -0,0 +1,47 @@
+"""Хранилище картинок постов с именами по содержимому.
+
+Файл называется SHA-256 своего содержимого в подкаталоге из двух
+первых символов хеша: posts/3f/3fa1….jpg. Повторная загрузка того же
+файла не пишет ничего на диск и возвращает имя уже сохранённого.
+Миниатюры sorl строятся по имени исходника, поэтому у постов с одной
+картинкой они тоже общие. Сколько постов ссылается на файл, считает
+posts.images, он же удаляет файлы без ссылок. Файл, удалённый как
+ничей, при следующей загрузке записывается заново.
+"""
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = content_hash(content)
+        directory, basename = posixpath.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        name = posixpath.join(directory, digest[:2], digest + extension)
+        # posts.images импортирует модели, а модели — это хранилище.
+        from posts.images import hold
+        # До конца транзакции discard() не удалит файл, найденный здесь.
+        # Вне транзакции вызывающего она защищает хотя бы проверку и
+        # запись файла.
+        with transaction.atomic(savepoint=False):
+            hold(name)
+            if self.exists(name):
+                return name
+            return super().save(name, content, max_length)
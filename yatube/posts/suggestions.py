@@ -0,0 +1,121 @@
+"""Рекомендации «на кого подписаться».
+
+build() читает граф подписок и пары автор–группа целиком, держит их
+в памяти разреженными списками смежности (множество соседей на
+пользователя) и для каждого пользователя считает кандидатов:
+
+- друзья друзей: вес SUGGESTIONS_FOLLOW_WEIGHT за каждого общего
+  автора, на которого подписан пользователь и который подписан на
+  кандидата;
+- соавторы групп: вес SUGGESTIONS_GROUP_WEIGHT за каждую группу, где
+  писали и пользователь, и кандидат.
+
+Вершины, у которых соседей больше SUGGESTIONS_HUB_LIMIT, в подсчёте не
+участвуют: подписка на всех подряд или огромная группа ничего не
+говорит о вкусах и даёт квадратичный перебор. Первые SUGGESTIONS_TOP_K
+кандидатов сохраняются в Suggestion, так что страница читает готовый
+список одним запросом по индексу (user, rank).
+"""
+import heapq
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+from posts.models import Follow, Post, Suggestion, User
+
+BATCH_SIZE = 5000
+
+
+def _adjacency(pairs):
+    adjacency = defaultdict(set)
+    for left, right in pairs:
+        adjacency[left].add(right)
+    return adjacency
+
+
+def _add(scores, neighbours, weight, hub_limit):
+    for neighbour_set in neighbours:
+        if len(neighbour_set) > hub_limit:
+            continue
+        for candidate in neighbour_set:
+            scores[candidate] += weight
+
+
+def candidates(following, groups, members, user_id, top_k):
+    """Первые top_k кандидатов пользователя: пары (оценка, id)."""
+    hub_limit = settings.SUGGESTIONS_HUB_LIMIT
+    scores = Counter()
+    own = following.get(user_id, set())
+    if len(own) <= hub_limit:
+        _add(
+            scores,
+            (following[author] for author in own if author in following),
+            settings.SUGGESTIONS_FOLLOW_WEIGHT,
+            hub_limit,
+        )
+    _add(
+        scores,
+        (members[group] for group in groups.get(user_id, ())),
+        settings.SUGGESTIONS_GROUP_WEIGHT,
+        hub_limit,
+    )
+    for excluded in own | {user_id}:
+        scores.pop(excluded, None)
+    # При равной оценке выше тот, кто зарегистрировался раньше.
+    return heapq.nlargest(
+        top_k,
+        ((score, -candidate) for candidate, score in scores.items())
+    )
+
+
+def _suggestions(top_k):
+    following = _adjacency(
+        Follow.objects.values_list('user_id', 'author_id').iterator()
+    )
+    groups, members = defaultdict(set), defaultdict(set)
+    for author, group in Post.objects.filter(
+        group__isnull=False
+    ).values_list('author_id', 'group_id').distinct().iterator():
+        groups[author].add(group)
+        members[group].add(author)
+    for user_id in following.keys() | groups.keys():
+        top = candidates(following, groups, members, user_id, top_k)
+        for rank, (score, candidate) in enumerate(top, 1):
+            yield Suggestion(
+                user_id=user_id,
+                candidate_id=-candidate,
+                rank=rank,
+                score=score,
+            )
+
+
+@transaction.atomic
+def build(top_k=None):
+    """Пересчитывает рекомендации всех пользователей."""
+    top_k = top_k or settings.SUGGESTIONS_TOP_K
+    Suggestion.objects.all().delete()
+    rows = _suggestions(top_k)
+    total = 0
+    while True:
+        batch = list(islice(rows, BATCH_SIZE))
+        if not batch:
+            return total
+        Suggestion.objects.bulk_create(batch)
+        total += len(batch)
+
+
+def suggested(user, limit=None):
+    """Рекомендации для пользователя без тех, на кого он уже подписан.
+
+    Подписки могли измениться после build(), поэтому уже подписанные
+    отсеиваются подзапросом в том же запросе.
+    """
+    if not user.is_authenticated:
+        return []
+    return list(User.objects.filter(
+        suggested_to__user=user
+    ).exclude(
+        pk__in=Follow.objects.filter(user=user).values('author')
+    ).order_by('suggested_to__rank')[:limit or settings.SUGGESTIONS_SHOWN])
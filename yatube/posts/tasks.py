@@ -0,0 +1,4 @@
+"""Задачи приложения объявлены рядом с кодом, который они вызывают,
+а импортируются здесь, чтобы их нашёл core.apps."""
+from posts.images import process  # noqa: F401
+from posts.thumbnails import render  # noqa: F401
@@ -0,0 +1,101 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.http import QueryDict
+
+from posts import thumbnails
+from posts.feed_cache import post_cache
+from posts.paginators import elided_page_range
+
+
+register = template.Library()
+
+
+class FeedCacheNode(template.Node):
+    def __init__(self, nodelist):
+        self.nodelist = nodelist
+
+    def render(self, context):
+        params = context.get('feed_cache')
+        if not params:
+            return self.nodelist.render(context)
+        key = make_template_fragment_key('feed', [params['key']])
+        value = cache.get(key)
+        if value is None:
+            value = self.nodelist.render(context)
+            cache.set(key, value, params['timeout'])
+        return value
+
+
+@register.tag
+def feedcache(parser, token):
+    """Кеширует фрагмент ленты по параметрам из контекста feed_cache."""
+    nodelist = parser.parse(('endfeedcache',))
+    parser.delete_first_token()
+    return FeedCacheNode(nodelist)
+
+
+class PostCacheNode(template.Node):
+    def __init__(self, post, nodelist):
+        self.post = post
+        self.nodelist = nodelist
+
+    def render(self, context):
+        post = self.post.resolve(context)
+        params = post_cache(post)
+        if not params:
+            return self.nodelist.render(context)
+        key = make_template_fragment_key('post', [params['key']])
+        value = cache.get(key)
+        if value is None:
+            value = self.nodelist.render(context)
+            # Пока миниатюра готовится, во фрагменте оригинал картинки,
+            # такой фрагмент не сохраняем.
+            if thumbnails.ready(post.image):
+                cache.set(key, value, params['timeout'])
+        return value
+
+
+@register.tag
+def postcache(parser, token):
+    """Кеширует разметку поста, общую для всех лент."""
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError(
+            f'Тег {bits[0]} ожидает один аргумент: пост'
+        )
+    nodelist = parser.parse(('endpostcache',))
+    parser.delete_first_token()
+    return PostCacheNode(parser.compile_filter(bits[1]), nodelist)
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts):
+    """Ищет миниатюры картинок всех постов страницы одним запросом."""
+    thumbnails.prefetch(post.image for post in posts)
+    return ''
+
+
+@register.simple_tag(takes_context=True)
+def page_url(context, page):
+    """Ссылка на страницу.
+
+    GET-параметры запроса не копируются: разметка ленты кешируется, и
+    ссылки достались бы следующим посетителям. Параметры, которые
+    нужно сохранить, view передаёт в page_params.
+    """
+    query = QueryDict(mutable=True)
+    query.update(context.get('page_params', {}))
+    query['page'] = page
+    return f'?{query.urlencode()}'
+
+
+@register.simple_tag
+def page_window(page):
+    """Окно номеров страниц для шаблона пагинатора."""
+    return elided_page_range(
+        page,
+        on_each_side=settings.PAGINATOR_ON_EACH_SIDE,
+        on_ends=settings.PAGINATOR_ON_ENDS,
+    )
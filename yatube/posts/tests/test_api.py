@@ -0,0 +1,191 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='StasBasov', first_name='Стас', last_name='Басов'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Leo', slug='leo', description='Группа'
+        )
+        for num in range(settings.POSTS_AMOUNT + 2):
+            cls.post = Post.objects.create(
+                text=f'Пост {num}', author=cls.user, group=cls.group
+            )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_index(self):
+        response = self.client.get(reverse('posts:api_index'))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        data = response.json()
+        self.assertEqual(len(data['results']), settings.POSTS_AMOUNT)
+        self.assertEqual(data['page'], {
+            'number': 1, 'next': 2, 'previous': None,
+            'count': settings.POSTS_AMOUNT + 2, 'pages': 2,
+        })
+        self.assertEqual(data['results'][0], {
+            'id': self.post.pk,
+            'text': self.post.text,
+            'created': self.post.created.isoformat(),
+            'author': {'username': 'StasBasov', 'name': 'Стас Басов'},
+            'group': {'slug': 'leo', 'title': 'Leo'},
+            'image': None,
+            'comments': 1,
+        })
+
+    def test_feeds(self):
+        responses = {
+            'posts:api_group_list': {'slug': self.group.slug},
+            'posts:api_profile': {'username': self.user.username},
+        }
+        for name, kwargs in responses.items():
+            with self.subTest(name=name):
+                data = self.client.get(reverse(name, kwargs=kwargs)).json()
+                self.assertEqual(
+                    data['results'][0]['id'], self.post.pk
+                )
+        data = self.client.get(reverse(
+            'posts:api_post_detail', kwargs={'post_id': self.post.pk}
+        )).json()
+        self.assertEqual(data['comments'][0]['text'], 'Комментарий')
+
+    def test_not_found(self):
+        response = self.client.get(reverse(
+            'posts:api_group_list', kwargs={'slug': 'missing'}
+        ))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'detail': 'Группа не найдена'})
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag получает 304 без чтения постов"""
+        url = reverse('posts:api_index')
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+
+    def test_feed_revalidates_after_edit_and_delete(self):
+        """Правка и удаление поста не дают устаревшей ленты по дате"""
+        url = reverse('posts:api_index')
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        since = http_date()
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправлено'
+        post.save()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['text'], 'Исправлено')
+        etag = response['ETag']
+        post.delete()
+        for headers in (
+            {'HTTP_IF_MODIFIED_SINCE': since},
+            {'HTTP_IF_NONE_MATCH': etag},
+        ):
+            with self.subTest(headers=headers):
+                response = self.client.get(url, **headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(
+                    response.json()['results'][0]['id'], post.pk
+                )
+
+    def test_etag_changes(self):
+        url = reverse(
+            'posts:api_post_detail', kwargs={'post_id': self.post.pk}
+        )
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(
+            self.client.get(url, {'order': 'oldest'})['ETag'], etag
+        )
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Ещё'
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_etag_follows_post_version(self):
+        """ETag поста не зависит от правок других постов"""
+        url = reverse(
+            'posts:api_post_detail', kwargs={'post_id': self.post.pk}
+        )
+        etag = self.client.get(url)['ETag']
+        other = Post.objects.exclude(pk=self.post.pk).first()
+        other.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        post = Post.objects.get(pk=self.post.pk)
+        post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(COMMENTS_AMOUNT=1)
+    def test_comment_chunks(self):
+        """Комментарии отдаются порциями по курсору в обоих порядках"""
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Второй'
+        )
+        data = self.client.get(reverse(
+            'posts:api_post_detail', kwargs={'post_id': self.post.pk}
+        )).json()
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']], ['Второй']
+        )
+        url = reverse(
+            'posts:api_post_comments', kwargs={'post_id': self.post.pk}
+        )
+        data = self.client.get(url, {'cursor': data['comments_next']}).json()
+        self.assertEqual(
+            [comment['text'] for comment in data['results']], ['Комментарий']
+        )
+        self.assertIsNone(data['next'])
+        data = self.client.get(url, {'order': 'oldest'}).json()
+        self.assertEqual(data['results'][0]['text'], 'Комментарий')
+        data = self.client.get(url, {'cursor': data['next']}).json()
+        self.assertEqual(data['results'][0]['text'], 'Второй')
+        response = self.client.get(reverse(
+            'posts:api_post_comments', kwargs={'post_id': 0}
+        ))
+        self.assertEqual(response.status_code, 404)
+
+    def test_follow_index(self):
+        url = reverse('posts:api_follow_index')
+        response = self.client.get(url)
+        self.assertEqual(response.json()['results'], [])
+        self.assertIn('Cookie', response['Vary'])
+        Follow.objects.create(user=self.reader, author=self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len(response.json()['results']), settings.POSTS_AMOUNT
+        )
+        self.assertEqual(Client().get(url).status_code, 401)
+
+    @override_settings(POSTS_PAGINATION='cursor')
+    def test_cursor_pagination(self):
+        url = reverse('posts:api_index')
+        page = self.client.get(url).json()['page']
+        self.assertNotIn('count', page)
+        data = self.client.get(url, {'page': page['next']}).json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNone(data['page']['next'])
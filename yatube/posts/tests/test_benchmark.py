@@ -0,0 +1,56 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from posts import benchmark
+from posts.models import Comment, Follow, Post, Profile, TimelineEntry
+
+
+TEMP_BENCHMARK_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(BENCHMARK_DIR=TEMP_BENCHMARK_DIR)
+class BenchmarkTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        benchmark.Generator(batch_size=50).generate(
+            users=20,
+            groups=2,
+            posts=200,
+            comments=100,
+            follows_per_user=3,
+        )
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_BENCHMARK_DIR, ignore_errors=True)
+
+    def test_generated_data(self):
+        """Генератор создаёт данные и пересобирает производные таблицы"""
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertTrue(Comment.objects.exists())
+        self.assertTrue(Follow.objects.exists())
+        self.assertEqual(Profile.objects.count(), 20)
+        self.assertEqual(
+            sum(Profile.objects.values_list('post_count', flat=True)), 200
+        )
+        self.assertTrue(TimelineEntry.objects.exists())
+        self.assertGreater(
+            Post.objects.dates('created', 'day').count(), 1
+        )
+
+    def test_run_save_and_compare(self):
+        report = benchmark.run(iterations=2, warmup=0)
+        self.assertEqual(set(report['results']), {
+            'index', 'group_posts', 'profile', 'post_detail', 'follow_index'
+        })
+        for result in report['results'].values():
+            self.assertGreater(result['queries'], 0)
+            self.assertLessEqual(result['p50'], result['p99'])
+        path = benchmark.save(report)
+        changes = benchmark.compare(benchmark.load(path), report)
+        self.assertEqual(set(changes.values()), {0})
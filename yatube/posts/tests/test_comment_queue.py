@@ -0,0 +1,96 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import comment_queue
+from posts.models import Comment, Post, QueuedComment
+
+User = get_user_model()
+
+
+@override_settings(COMMENTS_WRITE_BEHIND=True)
+class CommentQueueTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def comment(self, post, text):
+        return self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            data={'text': text},
+        )
+
+    def detail(self, client, post, **params):
+        return client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}), params
+        )
+
+    def test_author_sees_queued_comment(self):
+        """Комментарий ждёт в очереди, но автор видит его сразу"""
+        self.comment(self.post, 'Из очереди')
+        self.assertFalse(Comment.objects.exists())
+        self.assertContains(self.detail(self.client, self.post), 'Из очереди')
+        self.assertContains(
+            self.detail(self.client, self.post, order='oldest'), 'Из очереди'
+        )
+        self.assertNotContains(self.detail(Client(), self.post), 'Из очереди')
+
+    def test_drain(self):
+        """Очередь переносится пачками со счётчиками комментариев"""
+        other = Post.objects.create(author=self.author, text='Другой')
+        for num in range(3):
+            self.comment(self.post, f'Комментарий {num}')
+        self.comment(other, 'К другому')
+        self.assertEqual(comment_queue.drain(batch_size=2), 2)
+        self.assertEqual(comment_queue.drain(), 2)
+        self.assertEqual(comment_queue.drain(), 0)
+        self.assertFalse(QueuedComment.objects.exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 3)
+        self.assertEqual(
+            list(self.post.comments.order_by('pk').values_list(
+                'text', flat=True
+            )),
+            [f'Комментарий {num}' for num in range(3)]
+        )
+        response = self.detail(self.client, other)
+        self.assertContains(response, 'К другому', count=1)
+        self.assertNotContains(response, 'публикуется')
+
+    def test_drain_keeps_submission_time(self):
+        """Перенесённый комментарий датирован отправкой, а не переносом"""
+        self.comment(self.post, 'Давний')
+        sent = timezone.now() - timedelta(hours=3)
+        QueuedComment.objects.update(created=sent)
+        comment_queue.drain()
+        self.assertEqual(Comment.objects.get(text='Давний').created, sent)
+
+    def test_command(self):
+        self.comment(self.post, 'Командой')
+        out = StringIO()
+        call_command('drain_comments', stdout=out)
+        self.assertIn('Перенесено комментариев: 1', out.getvalue())
+        self.assertTrue(Comment.objects.filter(text='Командой').exists())
+
+    def test_disabled(self):
+        """После выключения новые комментарии пишутся сразу, а оставшиеся
+        в очереди всё ещё видны авторам"""
+        self.comment(self.post, 'Из очереди')
+        with self.settings(COMMENTS_WRITE_BEHIND=False):
+            self.comment(self.post, 'Сразу')
+            response = self.detail(self.client, self.post)
+        self.assertEqual(QueuedComment.objects.count(), 1)
+        self.assertTrue(Comment.objects.filter(text='Сразу').exists())
+        self.assertContains(response, 'Из очереди')
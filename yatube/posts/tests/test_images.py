@@ -0,0 +1,156 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.test import (
+    TestCase, TransactionTestCase, override_settings
+)
+from PIL import Image
+
+from posts import images
+from posts.forms import PostForm
+from posts.models import ImageRef, Post
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+ORIENTATION = 0x0112
+
+User = get_user_model()
+
+
+def jpeg(size, orientation=None):
+    content = BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[ORIENTATION] = orientation
+    Image.new('RGB', size, 'red').save(content, 'JPEG', exif=exif)
+    return SimpleUploadedFile('photo.jpg', content.getvalue(), 'image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGES_IN_TASKS=False)
+class ImageProcessingTest(TransactionTestCase):
+    """Файлы удаляются после фиксации транзакции, поэтому без TestCase."""
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='Stas')
+
+    def test_process(self):
+        """Картинка уменьшается, поворачивается по EXIF и теряет его"""
+        # Ориентация 6: снимок повёрнут на 90 градусов.
+        post = Post.objects.create(
+            text='Фото', author=self.user, image=jpeg((3000, 2000), 6)
+        )
+        original = post.image.name
+        self.assertTrue(images.needs_processing(post.image))
+
+        # Без пула картинка обрабатывается сразу после фиксации.
+        post.refresh_from_db()
+        self.assertTrue(post.image.name.startswith(images.PROCESSED_DIR))
+        self.assertFalse(images.needs_processing(post.image))
+        self.assertEqual(post.version, 2)
+        self.assertFalse(default_storage.exists(original))
+        self.assertEqual(
+            list(ImageRef.objects.values_list('name', 'refs')),
+            [(post.image.name, 1)]
+        )
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (1280, 1920))
+            self.assertEqual(image.format, 'JPEG')
+            self.assertNotIn(ORIENTATION, image.getexif())
+
+    def test_identical_uploads_share_file(self):
+        """Одинаковые картинки хранятся одним файлом до последней ссылки"""
+        first, second = (
+            Post.objects.create(
+                text='Мем', author=self.user, image=jpeg((50, 50))
+            )
+            for _ in range(2)
+        )
+        first.refresh_from_db()
+        second.refresh_from_db()
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(ImageRef.objects.get(name=name).refs, 2)
+
+        # Результат обработки уже заменённой картинки совпал с файлом
+        # других постов и не должен быть удалён.
+        descriptor, path = tempfile.mkstemp(suffix='.jpg')
+        with os.fdopen(descriptor, 'wb') as output:
+            output.write(default_storage.open(name).read())
+        images._apply(first.pk, 'posts/replaced.jpg', path)
+        self.assertTrue(default_storage.exists(name))
+
+        first.delete()
+        self.assertTrue(default_storage.exists(name))
+        second.text = 'Без картинки'
+        second.image = None
+        second.save()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(ImageRef.objects.exists())
+
+    def test_discard_rechecks_refs(self):
+        """Файл, на который сослались после снятия ссылки, не удаляется"""
+        storage = images._storage()
+        with transaction.atomic():
+            name = storage.save('posts/photo.jpg', jpeg((50, 50)))
+            images.change_refs(acquire=name)
+            # Удаление, запланированное при снятии прежней ссылки.
+            images.discard(name)
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(ImageRef.objects.get(name=name).refs, 1)
+        images.change_refs(release=name)
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(ImageRef.objects.exists())
+
+    def test_reencode_does_not_touch_database(self):
+        """Пул только пишет временный файл, в хранилище его кладёт _apply"""
+        with mock.patch.object(images, 'process_later'):
+            post = Post.objects.create(
+                text='Фото', author=self.user, image=jpeg((50, 50))
+            )
+        original = post.image.name
+        refs = list(ImageRef.objects.values_list('name', 'refs'))
+        with self.assertNumQueries(0):
+            path = images._reencode(original)
+        self.assertEqual(
+            list(ImageRef.objects.values_list('name', 'refs')), refs
+        )
+        images._apply(post.pk, original, path)
+        post.refresh_from_db()
+        self.assertTrue(post.image.name.startswith(images.PROCESSED_DIR))
+        self.assertTrue(default_storage.exists(post.image.name))
+        self.assertFalse(default_storage.exists(original))
+        self.assertFalse(os.path.exists(path))
+
+    def test_hold_requires_transaction(self):
+        with self.assertRaises(transaction.TransactionManagementError):
+            images.hold('posts/photo.jpg')
+
+
+class ImageFormTest(TestCase):
+    def test_form_limits(self):
+        """Форма отклоняет тяжёлые файлы и большие разрешения"""
+        cases = (
+            ({'POST_IMAGE_MAX_BYTES': 100}, 'Файл больше 100\xa0байт'),
+            ({'POST_IMAGE_MAX_PIXELS': 100}, 'Разрешение'),
+        )
+        for limits, error in cases:
+            with self.subTest(limits=limits), override_settings(**limits):
+                form = PostForm(
+                    {'text': 'Фото'}, files={'image': jpeg((20, 20))}
+                )
+                self.assertFalse(form.is_valid())
+                self.assertIn(error, form.errors['image'][0])
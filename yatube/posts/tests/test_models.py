@@ -1,7 +1,14 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-from posts.models import Group, Post
+from posts.models import Comment, Follow, Group, Post, Profile
 
 
 User = get_user_model()
@@ -61,3 +68,122 @@ class PostModelsTest(TestCase):
                     self.post._meta.get_field(field).verbose_name,
                     value
                 )
+
+    def test_version_bumped_on_save(self):
+        """Каждое сохранение увеличивает номер правки и дату изменения"""
+        post = Post.objects.create(author=self.user, text='Правка')
+        created = post.updated
+        self.assertEqual(post.version, 1)
+        post.text = 'Правка 2'
+        post.save()
+        stale = Post.objects.get(pk=post.pk)
+        seen = []
+
+        def remember_version(instance, **kwargs):
+            seen.append(instance.version)
+
+        post_save.connect(remember_version, sender=Post)
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                post.save(update_fields=['text'])
+        finally:
+            post_save.disconnect(remember_version, sender=Post)
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if query['sql'].startswith('SELECT')
+        ])
+        self.assertEqual(post.version, 3)
+        self.assertEqual(seen, [3])
+        self.assertGreater(post.updated, created)
+        stale.save()
+        self.assertEqual(stale.version, 3)
+        stale.refresh_from_db()
+        self.assertEqual(stale.version, 4)
+        comment = Comment.objects.create(
+            author=self.user, post=post, text='Комментарий'
+        )
+        comment.save()
+        self.assertEqual(comment.version, 2)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.follower = User.objects.create_user(username='follower')
+
+    def counters(self, user):
+        profile = Profile.objects.get(user=user)
+        return (
+            profile.post_count,
+            profile.follower_count,
+            profile.following_count
+        )
+
+    def test_counters_follow_writes(self):
+        """Проверка поддержки счётчиков при записи и удалении"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        follow = Follow.objects.create(user=self.follower, author=self.author)
+        comment = Comment.objects.create(
+            author=self.follower, post=post, text='Комментарий'
+        )
+        post.refresh_from_db()
+        self.assertEqual(self.counters(self.author), (1, 1, 0))
+        self.assertEqual(self.counters(self.follower), (0, 0, 1))
+        self.assertEqual(post.comment_count, 1)
+
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+        self.assertEqual(self.counters(self.follower), (0, 0, 0))
+        post.delete()
+        self.assertEqual(self.counters(self.author), (0, 0, 0))
+
+    def group_counters(self, group):
+        group.refresh_from_db()
+        return group.post_count, group.last_post_at
+
+    def test_group_counters(self):
+        """Число и дата последней записи группы при записи, переносе и
+        удалении поста"""
+        first = Group.objects.create(title='Первая', slug='first')
+        second = Group.objects.create(title='Вторая', slug='second')
+        old = Post.objects.create(author=self.author, group=first, text='1')
+        new = Post.objects.create(author=self.author, group=first, text='2')
+        self.assertEqual(self.group_counters(first), (2, new.created))
+        self.assertEqual(self.group_counters(second), (0, None))
+
+        client = Client()
+        client.force_login(self.author)
+        client.post(
+            reverse('posts:post_edit', kwargs={'post_id': new.pk}),
+            data={'text': 'Перенесён', 'group': second.pk},
+        )
+        self.assertEqual(self.group_counters(first), (1, old.created))
+        self.assertEqual(self.group_counters(second), (1, new.created))
+
+        old.text = 'Без смены группы'
+        old.save(update_fields=['text'])
+        self.assertEqual(self.group_counters(first), (1, old.created))
+        old.delete()
+        self.assertEqual(self.group_counters(first), (0, None))
+
+    def test_recount_counters_command(self):
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {num}') for num in range(3)
+        )
+        Profile.objects.filter(user=self.follower).delete()
+        Profile.objects.filter(user=self.author).update(follower_count=5)
+        group = Group.objects.create(title='Группа', slug='recount')
+        Post.objects.bulk_create(
+            Post(author=self.author, group=group, text=f'В группе {num}')
+            for num in range(2)
+        )
+        call_command('recount_counters', stdout=StringIO())
+        self.assertEqual(self.counters(self.author), (5, 0, 0))
+        self.assertEqual(self.counters(self.follower), (0, 0, 0))
+        self.assertEqual(self.group_counters(group), (
+            2, group.posts.latest('created').created
+        ))
@@ -0,0 +1,61 @@
+import re
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+
+from posts import benchmark, query_plans
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Планы проверяются на SQLite')
+class QueryPlansTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        benchmark.Generator(batch_size=50).generate(
+            users=20,
+            groups=2,
+            posts=100,
+            comments=50,
+            follows_per_user=3,
+        )
+
+    def test_problems(self):
+        """Полный просмотр и временная сортировка считаются проблемами"""
+        plan = [
+            '2 0 0 SCAN posts_post',
+            '3 0 0 SCAN posts_post USING INDEX posts_post_created_6da6a35d',
+            '9 0 0 USE TEMP B-TREE FOR ORDER BY',
+        ]
+        self.assertEqual(query_plans.problems(plan), ['scan', 'sort'])
+        self.assertEqual(query_plans.problems(plan[1:2]), [])
+        self.assertEqual(query_plans.problems(plan, {'sort'}), ['scan'])
+
+    def test_feed_plans_use_indexes(self):
+        """Запросы лент в обоих режимах пагинации идут по индексам"""
+        results = query_plans.check()
+        self.assertEqual(
+            {(result['feed'], result['pagination']) for result in results},
+            {
+                (feed, pagination)
+                for feed in benchmark.targets()[1]
+                for pagination in ('offset', 'cursor')
+            }
+        )
+        self.assertEqual(
+            [result['sql'] for result in results if result['problems']], []
+        )
+
+    def test_command(self):
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('в порядке', out.getvalue())
+
+    def test_command_fails_on_problems(self):
+        patterns = {'lookup': re.compile('INTEGER PRIMARY KEY')}
+        with mock.patch.dict(query_plans.PROBLEMS['sqlite'], patterns):
+            with self.assertRaisesMessage(CommandError, 'Проблемные планы'):
+                call_command('check_query_plans', stdout=StringIO())
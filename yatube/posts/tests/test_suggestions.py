@@ -0,0 +1,70 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import suggestions
+from posts.models import Follow, Group, Post, Suggestion
+
+User = get_user_model()
+
+
+class SuggestionsTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.reader, a, b, cls.c, cls.d, cls.e = (
+            User.objects.create_user(username=name)
+            for name in ('reader', 'a', 'b', 'c', 'd', 'e')
+        )
+        for user, author in (
+            (cls.reader, a), (cls.reader, b),
+            (a, cls.c), (b, cls.c), (b, cls.d),
+        ):
+            Follow.objects.create(user=user, author=author)
+        group = Group.objects.create(title='Leo', slug='leo')
+        for author in (cls.reader, cls.e):
+            Post.objects.create(text='Пост', author=author, group=group)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_build(self):
+        """Друзья друзей выше соавторов группы, подписки не предлагаются"""
+        suggestions.build()
+        self.assertEqual(
+            list(Suggestion.objects.filter(user=self.reader).values_list(
+                'candidate__username', 'score'
+            ).order_by('rank')),
+            [('c', 2.0), ('d', 1.0), ('e', 0.5)]
+        )
+        self.assertEqual(
+            [user.username for user in suggestions.suggested(self.e)],
+            ['reader']
+        )
+
+    @override_settings(SUGGESTIONS_HUB_LIMIT=2)
+    def test_hubs_skipped(self):
+        """Подписки b больше лимита и не участвуют в подсчёте"""
+        Follow.objects.create(
+            user=User.objects.get(username='b'), author=self.e
+        )
+        suggestions.build()
+        self.assertEqual(
+            [user.username for user in suggestions.suggested(self.reader)],
+            ['c', 'e']
+        )
+
+    def test_followed_filtered_on_read(self):
+        call_command('build_suggestions', stdout=StringIO())
+        Follow.objects.create(user=self.reader, author=self.c)
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            [user.username for user in response.context['suggestions']],
+            ['d', 'e']
+        )
@@ -0,0 +1,131 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+
+from posts import images, thumbnails
+from posts.feed_cache import feed_version
+from posts.models import Post
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+User = get_user_model()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGES_IN_TASKS=True)
+class PrerenderThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Stas')
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        content = BytesIO()
+        Image.new('RGB', (1200, 800), 'red').save(content, 'JPEG')
+        self.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile('big.jpg', content.getvalue()),
+        )
+
+    def test_original_until_thumbnail_is_ready(self):
+        """Пока миниатюры нет, отдаётся оригинал, потом миниатюра"""
+        geometry, options = settings.POST_THUMBNAILS[0]
+        image = default.backend.get_thumbnail(
+            self.post.image, geometry, **options
+        )
+        self.assertEqual(image.name, self.post.image.name)
+        self.assertFalse(thumbnails.ready(self.post.image))
+
+        thumbnails.render(
+            self.post.image.name,
+            'posts.storage.ContentAddressedStorage',
+            geometry,
+            options,
+        )
+        thumbnail = default.backend.prepare(
+            self.post.image, geometry, **options
+        )[1]
+
+        image = default.backend.get_thumbnail(
+            self.post.image, geometry, **settings.POST_THUMBNAILS[0][1]
+        )
+        self.assertEqual(image.name, thumbnail.name)
+        self.assertEqual(image.size, [960, 339])
+        self.assertTrue(thumbnails.ready(self.post.image))
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POST_IMAGES_IN_TASKS=True,
+    TASKS_BACKEND='core.tasks.ImmediateBackend',
+)
+class ThumbnailTaskTest(TransactionTestCase):
+    """Задача ставится после фиксации, поэтому без TestCase."""
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='Stas')
+
+    def test_thumbnail_task_refreshes_feed(self):
+        """Готовая миниатюра из задачи попадает в ленту, закешированную
+        с оригиналом"""
+        content = BytesIO()
+        Image.new('RGB', (1200, 800), 'red').save(content, 'JPEG')
+        geometry, options = settings.POST_THUMBNAILS[0]
+        # Пересжатие картинки здесь не нужно, а задачи выполнятся только
+        # после фиксации.
+        with mock.patch.object(images.process, 'delay'), \
+                transaction.atomic():
+            post = Post.objects.create(
+                text='Пост с картинкой',
+                author=self.user,
+                image=SimpleUploadedFile('big.jpg', content.getvalue()),
+            )
+            response = self.client.get(reverse('posts:index'))
+            self.assertContains(response, post.image.url)
+            version = feed_version()
+
+        self.assertTrue(thumbnails.ready(post.image))
+        self.assertNotEqual(feed_version(), version)
+        thumbnail = default.backend.prepare(post.image, geometry, **options)[1]
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, thumbnail.url)
+        self.assertNotContains(response, post.image.url)
+
+    def test_pending_thumbnail_queued_once(self):
+        """Пока задача в очереди, запросы не ставят её снова"""
+        content = BytesIO()
+        Image.new('RGB', (1200, 800), 'red').save(content, 'JPEG')
+        with mock.patch.object(images.process, 'delay'), \
+                mock.patch.object(thumbnails.render, 'delay') as delay:
+            post = Post.objects.create(
+                text='Пост с картинкой',
+                author=self.user,
+                image=SimpleUploadedFile('big.jpg', content.getvalue()),
+            )
+            thumbnails.prerender(post.image)
+            thumbnails.prerender(post.image)
+        delay.assert_called_once()
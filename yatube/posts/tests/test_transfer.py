@@ -0,0 +1,127 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from posts import transfer
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class TransferTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            description='Описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            group=cls.group,
+            text='Пост в группе',
+        )
+        Post.objects.create(author=cls.author, text='Пост без группы')
+        Comment.objects.create(
+            author=cls.reader, post=cls.post, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def test_export(self):
+        records = list(transfer.export())
+        self.assertEqual(
+            [record['model'] for record in records],
+            ['group', 'post', 'post', 'comment', 'follow']
+        )
+        self.assertEqual(records[1]['author'], 'author')
+        self.assertEqual(records[1]['group'], 'group')
+        self.assertEqual(records[3]['post'], self.post.pk)
+        self.assertEqual(
+            records[4], {'model': 'follow', 'user': 'reader',
+                         'author': 'author'}
+        )
+
+    def test_import_remaps_keys(self):
+        """Посты получают новые id, комментарии едут за ними"""
+        last = Post.objects.order_by('-pk').first().pk
+        lines = [
+            json.dumps(record) for record in transfer.export()
+        ] + [json.dumps({
+            'model': 'follow', 'user': 'newcomer', 'author': 'author'
+        })]
+        stats = transfer.Importer(batch_size=1).load(lines)
+        self.assertEqual(stats['post'], 2)
+        self.assertEqual(stats['group'], 0)
+        self.assertEqual(stats['user'], 1)
+        self.assertEqual(Post.objects.count(), 4)
+        self.assertEqual(Group.objects.count(), 1)
+        copy = Post.objects.exclude(pk=self.post.pk).get(
+            text=self.post.text
+        )
+        self.assertGreater(copy.pk, last)
+        self.assertEqual(copy.group, self.group)
+        self.assertEqual(copy.created, self.post.created)
+        self.assertEqual(copy.comments.get().author, self.reader)
+        self.assertTrue(Follow.objects.filter(
+            user__username='newcomer', author=self.author
+        ).exists())
+        self.assertEqual(Follow.objects.count(), 2)
+
+    def test_import_skips_orphan_comments(self):
+        stats = transfer.Importer().load([json.dumps({
+            'model': 'comment', 'post': 0, 'author': 'reader',
+            'created': '2020-01-01T00:00:00+00:00', 'text': 'Потерялся',
+        })])
+        self.assertEqual(stats['skipped'], 1)
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_commands_round_trip(self):
+        path = os.path.join(TEMP_DIR, 'posts.ndjson.gz')
+        call_command('export_posts', path, stderr=StringIO())
+        out = StringIO()
+        call_command('import_posts', path, stdout=out, stderr=StringIO())
+        self.assertIn('post 2', out.getvalue())
+        self.assertEqual(Post.objects.count(), 4)
+        self.assertEqual(
+            User.objects.get(username='author').profile.post_count, 4
+        )
+
+    def test_import_broken_line(self):
+        path = os.path.join(TEMP_DIR, 'broken.ndjson')
+        with open(path, 'w') as file:
+            file.write('{"model": "post"}\n')
+        with self.assertRaisesMessage(CommandError, 'Строка 1'):
+            call_command('import_posts', path, stderr=StringIO())
+
+    def test_import_broken_batch_reports_lines(self):
+        """Ошибка записи пачки называет её строки в файле"""
+        path = os.path.join(TEMP_DIR, 'bad_date.ndjson')
+        post = {
+            'model': 'post', 'id': 1, 'author': 'author', 'group': None,
+            'text': 'Пост', 'image': None,
+            'created': '2020-01-01T00:00:00+00:00',
+        }
+        with open(path, 'w') as file:
+            file.write(json.dumps(post) + '\n')
+            file.write(json.dumps(dict(post, id=2, created='вчера')) + '\n')
+        with self.assertRaisesMessage(CommandError, 'Строки 1-2'):
+            call_command('import_posts', path, stderr=StringIO())
+        self.assertEqual(Post.objects.count(), 2)
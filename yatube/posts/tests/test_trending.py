@@ -0,0 +1,71 @@
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import trending
+from posts.models import (
+    Comment, Follow, Group, Post, TrendingGroup, TrendingPost
+)
+
+User = get_user_model()
+
+
+class TrendingTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Leo', slug='leo')
+        cls.post = Post.objects.create(
+            text='Обсуждаемый', author=cls.author, group=cls.group
+        )
+        cls.quiet = Post.objects.create(text='Тихий', author=cls.reader)
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def scores(self):
+        return (
+            dict(TrendingPost.objects.values_list('post_id', 'score')),
+            dict(TrendingGroup.objects.values_list('group_id', 'score')),
+        )
+
+    def test_update(self):
+        """Оценки затухают, а новые события учитываются один раз"""
+        now = timezone.now()
+        trending.update(now)
+        self.assertEqual(self.scores(), (
+            {self.post.pk: 3.5, self.quiet.pk: 1.0},
+            {self.group.pk: 3.5},
+        ))
+
+        Comment.objects.create(
+            post=self.quiet, author=self.author, text='Ответ'
+        )
+        trending.update(timezone.now() + settings.TRENDING_HALF_LIFE)
+        posts, groups = self.scores()
+        self.assertAlmostEqual(posts[self.post.pk], 1.75, places=3)
+        self.assertAlmostEqual(posts[self.quiet.pk], 2.5, places=3)
+        self.assertAlmostEqual(groups[self.group.pk], 1.75, places=3)
+
+    def test_trending_page(self):
+        call_command('update_trending', stdout=StringIO())
+        url = reverse('posts:trending')
+        response = Client().get(url)
+        self.assertEqual(
+            list(response.context['posts']), [self.post, self.quiet]
+        )
+        self.assertContains(response, self.group.title)
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        self.assertNotContains(Client().get(url), 'Без сигналов')
@@ -1,16 +1,31 @@
+import json
 import math
+import shutil
+import tempfile
+from io import BytesIO
 from itertools import islice
 
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.conf import settings
+from django.core.paginator import Paginator
 from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
+from PIL import Image
 
-from posts.models import User, Group, Post, Follow
+from posts.models import (
+    Comment, Follow, Group, Post, Profile, Suggestion, TimelineEntry, User
+)
+from posts import follow_graph
+from posts.feed_cache import post_cache
 from posts.forms import PostForm
+from posts.paginators import ELLIPSIS, elided_page_range
 
 
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
 User = get_user_model()
 
 
@@ -170,7 +185,7 @@ class ViewURLTest(TestCase):
 
     def test_cache(self):
         response = self.authorized_client.get(reverse('posts:index')).content
-        self.post.delete()
+        Post.objects.filter(id=self.post.id).update(text='Без сигналов')
         self.assertEqual(
             response,
             self.authorized_client.get(reverse('posts:index')).content
@@ -181,6 +196,109 @@ class ViewURLTest(TestCase):
             self.authorized_client.get(reverse('posts:index')).content
         )
 
+    def test_cache_invalidation(self):
+        """Изменение поста сбрасывает кеш лент"""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        ]
+        cached = {
+            url: self.authorized_client.get(url).content for url in urls
+        }
+        self.post.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotEqual(
+                    cached[url],
+                    self.authorized_client.get(url).content
+                )
+
+    def test_cache_keyed_on_page(self):
+        Post.objects.bulk_create(
+            Post(text=f'Пост {num}', author=self.user)
+            for num in range(settings.POSTS_AMOUNT)
+        )
+        url = reverse('posts:index')
+        self.assertNotEqual(
+            self.authorized_client.get(url).content,
+            self.authorized_client.get(url, {'page': 2}).content
+        )
+
+    def test_cache_keyed_on_normalized_page(self):
+        """Мусорный ?page= и чужие параметры не плодят записей кеша"""
+        Post.objects.bulk_create(
+            Post(text=f'Пост {num}', author=self.user)
+            for num in range(settings.POSTS_AMOUNT)
+        )
+        url = reverse('posts:index')
+        response = self.authorized_client.get(
+            url, {'page': 'мусор', 'utm_source': 'рассылка'}
+        )
+        self.assertNotContains(response, 'utm_source')
+        Post.objects.filter(id=self.post.id).update(text='Без сигналов')
+        self.assertEqual(
+            response.content, self.authorized_client.get(url).content
+        )
+
+    @override_settings(COMMENTS_AMOUNT=2)
+    def test_post_detail_comment_chunks(self):
+        """На странице поста только первая порция комментариев"""
+        post = Post.objects.create(text='Обсуждаемый', author=self.user)
+        for num in range(3):
+            Comment.objects.create(
+                post=post, author=self.follower, text=f'Коммент {num}'
+            )
+        url = reverse('posts:post_detail', kwargs={'post_id': post.id})
+        response = self.authorized_client.get(url)
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Коммент 2', 'Коммент 1']
+        )
+        fragment = self.authorized_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': post.id}),
+            {'cursor': response.context['comments_next']}
+        )
+        self.assertContains(fragment, 'Коммент 0')
+        self.assertNotContains(fragment, 'Коммент 1')
+        self.assertNotContains(fragment, 'Показать ещё')
+        response = self.authorized_client.get(url, {'order': 'oldest'})
+        self.assertEqual(response.context['comments'][0].text, 'Коммент 0')
+        self.assertContains(response, 'Показать ещё')
+        response = self.authorized_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(FEED_CACHE_ENABLED=False)
+    def test_cache_disabled(self):
+        response = self.authorized_client.get(reverse('posts:index')).content
+        Post.objects.filter(id=self.post.id).update(text='Без сигналов')
+        self.assertNotEqual(
+            response,
+            self.authorized_client.get(reverse('posts:index')).content
+        )
+
+    def test_post_fragment_shared_between_feeds(self):
+        """Разметка поста из общей ленты переиспользуется в подписках"""
+        self.authorized_client.get(reverse('posts:index'))
+        key = make_template_fragment_key(
+            'post', [post_cache(self.post_follower)['key']]
+        )
+        fragment = cache.get(key)
+        self.assertIn(self.post_follower.text, fragment)
+        cache.set(key, fragment.replace('подробная', 'закешированная'))
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'закешированная')
+
+    def test_post_fragment_follows_edits(self):
+        self.authorized_client.get(reverse('posts:follow_index'))
+        post = Post.objects.get(id=self.post_follower.id)
+        post.text = 'Правка'
+        post.save(update_fields=['text'])
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Правка')
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -237,3 +355,421 @@ class PaginatorViewsTest(TestCase):
             with self.subTest(reverse_name=reverse_name):
                 response = self.authorized_client.get(reverse_name)
                 self.assertEqual(len(response.context['page_obj']), expected)
+
+    def test_elided_page_range(self):
+        """Пагинатор выводит окно страниц с пропусками"""
+        paginator = Paginator(range(500), 10)
+        self.assertEqual(
+            elided_page_range(paginator.page(25), on_each_side=2, on_ends=1),
+            [1, ELLIPSIS, 23, 24, 25, 26, 27, ELLIPSIS, 50]
+        )
+        self.assertEqual(
+            elided_page_range(paginator.page(2), on_each_side=2, on_ends=1),
+            [1, 2, 3, 4, ELLIPSIS, 50]
+        )
+        self.assertEqual(
+            elided_page_range(Paginator(range(30), 10).page(1)), [1, 2, 3]
+        )
+
+    @override_settings(PAGINATOR_ON_EACH_SIDE=0, PAGINATOR_ON_ENDS=0)
+    def test_paginator_template_window(self):
+        content = self.authorized_client.get(
+            reverse('posts:index')
+        ).content.decode()
+        self.assertIn(ELLIPSIS, content)
+        self.assertNotIn('?page=2">2<', content)
+
+    @override_settings(POSTS_PAGINATION='cursor')
+    def test_cursor_paginator(self):
+        """Проверка обхода ленты курсорами вперёд и назад"""
+        url = reverse('posts:index')
+        first_page = self.authorized_client.get(url).context['page_obj']
+        page_obj = first_page
+        seen = list(first_page)
+        while page_obj.has_next():
+            cache.clear()
+            page_obj = self.authorized_client.get(
+                url, {'page': page_obj.next_page_number()}
+            ).context['page_obj']
+            self.assertLessEqual(len(page_obj), settings.POSTS_AMOUNT)
+            seen.extend(page_obj)
+        self.assertEqual(
+            seen,
+            list(Post.objects.order_by('-created', '-pk'))
+        )
+        cache.clear()
+        second_page = self.authorized_client.get(
+            url, {'page': first_page.next_page_number()}
+        ).context['page_obj']
+        cache.clear()
+        back = self.authorized_client.get(
+            url, {'page': second_page.previous_page_number()}
+        ).context['page_obj']
+        self.assertEqual(list(back), list(first_page))
+        self.assertFalse(back.has_previous())
+        cache.clear()
+        last = self.authorized_client.get(
+            url, {'page': 'last'}
+        ).context['page_obj']
+        self.assertEqual(list(last), seen[-settings.POSTS_AMOUNT:])
+        self.assertFalse(last.has_next())
+
+    @override_settings(GROUPS_AMOUNT=2)
+    def test_groups_directory(self):
+        """Каталог групп: сначала недавно активные, пустые в конце"""
+        groups = [
+            Group.objects.create(title=f'Группа {num}', slug=f'group-{num}')
+            for num in range(3)
+        ]
+        for group in (groups[1], groups[0]):
+            Post.objects.create(author=self.user, group=group, text='Пост')
+        url = reverse('posts:groups')
+        page_obj = self.authorized_client.get(url).context['page_obj']
+        self.assertEqual(list(page_obj), groups[:2])
+        self.assertEqual(page_obj[0].post_count, 1)
+        empty = self.authorized_client.get(url, {'page': 2}).context[
+            'page_obj'
+        ]
+        self.assertEqual(empty[0], groups[2])
+        self.assertTrue(all(group.last_post_at is None for group in empty))
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='StasBasov')
+        cls.author = User.objects.create_user(username='Author')
+        cls.star = User.objects.create_user(username='Star')
+        cls.fan = User.objects.create_user(username='Fan')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def follow_index_posts(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_fan_out_on_write(self):
+        """Пост автора раскладывается в ленты подписчиков"""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertTrue(post.fanned_out)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists()
+        )
+        self.assertEqual(self.follow_index_posts(), [post])
+
+    def test_follow_backfills_and_unfollow_drops(self):
+        post = Post.objects.create(text='Старый пост', author=self.author)
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.follow_index_posts(), [post])
+        follow.delete()
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+        self.assertEqual(self.follow_index_posts(), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_fan_out_on_read_for_popular_authors(self):
+        """Посты популярных авторов читаются без раскладки"""
+        Follow.objects.create(user=self.user, author=self.star)
+        Follow.objects.create(user=self.fan, author=self.star)
+        Follow.objects.create(user=self.user, author=self.author)
+        star_post = Post.objects.create(text='Звезда', author=self.star)
+        post = Post.objects.create(text='Автор', author=self.author)
+        self.assertFalse(star_post.fanned_out)
+        self.assertFalse(TimelineEntry.objects.filter(post=star_post).exists())
+        self.assertEqual(self.follow_index_posts(), [post, star_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_pages_merge_entries_and_popular_authors(self):
+        """Страницы ленты сливают записи ленты и посты популярных
+        авторов по дате в обоих режимах пагинации"""
+        Follow.objects.create(user=self.user, author=self.star)
+        Follow.objects.create(user=self.fan, author=self.star)
+        Follow.objects.create(user=self.user, author=self.author)
+        posts = [
+            Post.objects.create(
+                text=f'Пост {num}', author=(self.star, self.author)[num % 2]
+            )
+            for num in range(settings.POSTS_AMOUNT + 3)
+        ]
+        for entry in TimelineEntry.objects.select_related('post'):
+            self.assertEqual(entry.created, entry.post.created)
+        expected = sorted(
+            posts, key=lambda post: (post.created, post.pk), reverse=True
+        )
+        url = reverse('posts:follow_index')
+        for pagination in ('offset', 'cursor'):
+            with self.subTest(pagination=pagination), override_settings(
+                POSTS_PAGINATION=pagination
+            ):
+                first = self.authorized_client.get(url).context['page_obj']
+                second = self.authorized_client.get(
+                    url, {'page': first.next_page_number()}
+                ).context['page_obj']
+                self.assertEqual(list(first) + list(second), expected)
+                self.assertFalse(second.has_next())
+        with override_settings(POSTS_PAGINATION='offset'):
+            page_obj = self.authorized_client.get(url).context['page_obj']
+        self.assertEqual(page_obj.paginator.count, len(posts))
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='StasBasov')
+        cls.cat_post = Post.objects.create(
+            text='Кошка спит на диване',
+            author=cls.user,
+        )
+        cls.dog_post = Post.objects.create(
+            text='Собака и кошка гуляют, кошка бежит впереди',
+            author=cls.user,
+        )
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return response.context['page_obj']
+
+    def test_search_ranking(self):
+        """Поиск находит посты по словам и сортирует по релевантности"""
+        self.assertEqual(list(self.search('кошка')), [
+            self.dog_post, self.cat_post
+        ])
+        self.assertEqual(list(self.search('собака кошка')), [self.dog_post])
+        self.assertEqual(list(self.search('диван')), [self.cat_post])
+        self.assertEqual(list(self.search('" OR NEAR(')), [])
+        self.assertEqual(list(self.search('')), [])
+
+    def test_index_follows_post_changes(self):
+        post = Post.objects.get(pk=self.cat_post.pk)
+        post.text = 'Попугай'
+        post.save()
+        self.assertEqual(list(self.search('попугай')), [post])
+        self.assertEqual(list(self.search('диван')), [])
+        post.delete()
+        self.assertEqual(list(self.search('попугай')), [])
+
+    def test_search_pagination_keeps_query(self):
+        Post.objects.bulk_create(
+            Post(text=f'Кошка {num}', author=self.user)
+            for num in range(settings.POSTS_AMOUNT)
+        )
+        for post in Post.objects.filter(text__startswith='Кошка '):
+            post.save()
+        page_obj = self.search('кошка')
+        self.assertEqual(page_obj.paginator.count, settings.POSTS_AMOUNT + 2)
+        response = self.client.get(reverse('posts:search'), {'q': 'кошка'})
+        self.assertContains(response, 'href="?q=%D0%BA')
+        self.assertEqual(len(self.search('кошка', page=2)), 2)
+
+
+def png(color):
+    content = BytesIO()
+    Image.new('RGB', (20, 20), color).save(content, 'PNG')
+    return SimpleUploadedFile('photo.png', content.getvalue())
+
+
+@override_settings(QUERY_BUDGET_RAISE=True, MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='StasBasov')
+        cls.group = Group.objects.create(title='Leo', slug='leo')
+        # У постов разные картинки, поэтому миниатюры ищутся по
+        # нескольким ключам.
+        for num in range(settings.POSTS_AMOUNT + 1):
+            author = User.objects.create_user(
+                username=f'author{num}', first_name='Имя', last_name='Фамилия'
+            )
+            Follow.objects.create(user=cls.user, author=author)
+            cls.post = Post.objects.create(
+                text=f'Пост {num}', author=author, group=cls.group,
+                image=png((num * 20, 0, 0)),
+            )
+        Post.objects.create(
+            text='Ещё пост', author=cls.post.author, image=png('blue')
+        )
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_posts_views_within_budget(self):
+        """Ленты укладываются в бюджет запросов QUERY_BUDGETS"""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse(
+                'posts:profile',
+                kwargs={'username': self.post.author.username}
+            ),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:follow_index'),
+            reverse('posts:search') + '?q=пост',
+            reverse('posts:trending'),
+            reverse('posts:groups'),
+            reverse('posts:api_index'),
+            reverse('posts:api_group_list', kwargs={'slug': self.group.slug}),
+            reverse(
+                'posts:api_profile',
+                kwargs={'username': self.post.author.username}
+            ),
+            reverse('posts:api_post_detail', kwargs={'post_id': self.post.id}),
+            reverse(
+                'posts:post_comments', kwargs={'post_id': self.post.id}
+            ),
+            # Страница 404 с шапкой читает сессию и пользователя.
+            reverse('posts:post_comments', kwargs={'post_id': 0}),
+            reverse(
+                'posts:api_post_comments', kwargs={'post_id': self.post.id}
+            ),
+            reverse('posts:api_follow_index'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                # Каждая лента с холодным кешем, в том числе миниатюр.
+                cache.clear()
+                self.authorized_client.get(url)
+
+    def test_follow_index_cold_cache(self):
+        """Лента подписок с рекомендациями в бюджете и без прогретого кеша"""
+        candidate = User.objects.create_user(username='candidate')
+        Suggestion.objects.create(
+            user=self.user, candidate=candidate, rank=0, score=1
+        )
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['suggestions']), 1)
+        self.assertLessEqual(
+            int(response['X-DB-Queries']),
+            settings.QUERY_BUDGETS['posts:follow_index']
+        )
+
+
+class FollowGraphTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='StasBasov')
+        cls.authors = [
+            User.objects.create_user(username=f'author{num}')
+            for num in range(3)
+        ]
+        for author in cls.authors[:2]:
+            Follow.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_batch_membership_cached(self):
+        ids = [author.pk for author in self.authors]
+        expected = set(ids[:2])
+        self.assertEqual(follow_graph.followed(self.user, ids), expected)
+        with self.assertNumQueries(0):
+            self.assertEqual(follow_graph.followed(self.user, ids), expected)
+
+    def test_invalidation(self):
+        author = self.authors[2]
+        self.assertFalse(follow_graph.is_following(self.user, author.pk))
+        self.authorized_client.get(
+            reverse('posts:profile_follow', args=[author.username])
+        )
+        self.assertTrue(follow_graph.is_following(self.user, author.pk))
+        response = self.authorized_client.get(
+            reverse('posts:profile', args=[author.username])
+        )
+        self.assertTrue(response.context['following'])
+
+    @override_settings(FOLLOW_GRAPH_CACHE_LIMIT=1)
+    def test_too_many_followees(self):
+        """Большие множества подписок не кешируются целиком"""
+        self.assertIsNone(follow_graph.followees(self.user.pk))
+        ids = [author.pk for author in self.authors]
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                follow_graph.followed(self.user, ids), set(ids[:2])
+            )
+
+    def test_change_follows(self):
+        """Пакетная подписка обновляет счётчики и ленту и идемпотентна"""
+        user = User.objects.create_user(username='newcomer')
+        post = Post.objects.create(text='Пост', author=self.authors[0])
+        ids = [author.pk for author in self.authors]
+        self.assertEqual(
+            follow_graph.change_follows(user, follow=ids + [user.pk]), (3, 0)
+        )
+        self.assertEqual(
+            follow_graph.change_follows(user, follow=ids), (0, 0)
+        )
+        self.assertEqual(Follow.objects.filter(user=user).count(), 3)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=user, post=post).exists()
+        )
+        self.assertEqual(
+            Profile.objects.get(user=self.authors[0]).follower_count, 2
+        )
+        self.assertEqual(Profile.objects.get(user=user).following_count, 3)
+        self.assertEqual(follow_graph.followed(user, ids), set(ids))
+
+        self.assertEqual(
+            follow_graph.change_follows(user, unfollow=ids[:2]), (0, 2)
+        )
+        self.assertEqual(
+            follow_graph.change_follows(user, unfollow=ids[:2]), (0, 0)
+        )
+        self.assertFalse(TimelineEntry.objects.filter(user=user).exists())
+        self.assertEqual(
+            Profile.objects.get(user=self.authors[0]).follower_count, 1
+        )
+        self.assertEqual(Profile.objects.get(user=user).following_count, 1)
+        self.assertEqual(follow_graph.followed(user, ids), {ids[2]})
+
+    def test_follow_bulk_endpoint(self):
+        url = reverse('posts:api_follow_bulk')
+        response = self.authorized_client.post(
+            url,
+            json.dumps({
+                'follow': [self.authors[2].username, 'nobody'],
+                'unfollow': [self.authors[0].username],
+            }),
+            content_type='application/json'
+        )
+        self.assertEqual(response.json(), {
+            'followed': 1, 'unfollowed': 1, 'unknown': ['nobody']
+        })
+        self.assertEqual(
+            set(Follow.objects.filter(user=self.user).values_list(
+                'author__username', flat=True
+            )),
+            {self.authors[1].username, self.authors[2].username}
+        )
+        response = self.authorized_client.post(
+            url, {'follow': self.authors[0].username}
+        )
+        self.assertEqual(response.json()['followed'], 1)
+        self.assertEqual(Client().post(url).status_code, 401)
+        with override_settings(FOLLOW_BULK_LIMIT=1):
+            response = self.authorized_client.post(
+                url, {'follow': ['a', 'b']}
+            )
+        self.assertEqual(response.status_code, 400)
+
+    def test_unfollow_not_followed(self):
+        """Отписка от автора без подписки не падает"""
+        response = self.authorized_client.get(
+            reverse('posts:profile_unfollow', args=[self.authors[2].username])
+        )
+        self.assertEqual(response.status_code, 302)
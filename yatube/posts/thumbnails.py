@@ -0,0 +1,173 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Тег {% thumbnail %} работает через PrerenderThumbnailBackend: готовая
+миниатюра берётся из KV-хранилища sorl, а если её ещё нет, шаблон
+получает оригинал, а миниатюру строит задача render (см. core.tasks).
+Ленты в кеше могли сохранить оригинал, поэтому готовая миниатюра
+меняет версию лент.
+
+Имя миниатюры и её параметры разбирает сам ThumbnailBackend, и файл
+задача создаёт его же get_thumbnail, так что миниатюра из задачи не
+отличается от построенной sorl внутри запроса.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.helpers import get_module_class
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDbKVStore
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.tasks import task
+from posts.feed_cache import bump_feed_version
+
+
+def _pending_key(thumbnail):
+    return f'thumbnail-pending:{thumbnail.name}'
+
+
+@task
+def render(name, storage, geometry_string, options):
+    """Строит миниатюру и записывает её в KV-хранилище sorl."""
+    source = ImageFile(name, get_module_class(storage)())
+    backend = PrerenderThumbnailBackend()
+    thumbnail = backend.prepare(source, geometry_string, **options)[1]
+    try:
+        ThumbnailBackend.get_thumbnail(
+            backend, source, geometry_string, **options
+        )
+    finally:
+        cache.delete(_pending_key(thumbnail))
+    # Если исходник не прочитался, sorl пишет ошибку в лог и миниатюру
+    # не сохраняет.
+    if default.kvstore.get(thumbnail):
+        bump_feed_version()
+
+
+def _submit(source, thumbnail, geometry_string, options):
+    # Пока задача в очереди, другие запросы её не дублируют.
+    if cache.add(
+        _pending_key(thumbnail), True, settings.TASKS_LEASE.total_seconds()
+    ):
+        render.delay(
+            source.name, source.serialize_storage(), geometry_string, options
+        )
+
+
+class _Named(Exception):
+    """Останавливает ThumbnailBackend.get_thumbnail на имени миниатюры."""
+
+    def __init__(self, source, name, options):
+        super().__init__(name)
+        self.source = source
+        self.name = name
+        self.options = options
+
+
+class PrerenderThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который не рендерит миниатюры внутри запроса."""
+
+    naming = False
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        name = super()._get_thumbnail_filename(
+            source, geometry_string, options
+        )
+        if self.naming:
+            raise _Named(source, name, options)
+        return name
+
+    def prepare(self, file_, geometry_string, **options):
+        """Исходник, миниатюра и параметры, как их разберёт sorl.
+
+        get_thumbnail базового класса дополняет параметры и строит имя,
+        а на имени останавливается, ничего не читая из хранилища.
+        """
+        backend = type(self)()
+        backend.naming = True
+        try:
+            ThumbnailBackend.get_thumbnail(
+                backend, file_, geometry_string, **options
+            )
+        except _Named as named:
+            return (
+                named.source,
+                ImageFile(named.name, default.storage),
+                named.options,
+            )
+        raise AssertionError('ThumbnailBackend не запросил имя миниатюры')
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not settings.POST_IMAGES_IN_TASKS:
+            return super().get_thumbnail(file_, geometry_string, **options)
+        source, thumbnail, _ = self.prepare(
+            file_, geometry_string, **options
+        )
+        cached = default.kvstore.get(thumbnail)
+        if cached:
+            return cached
+        transaction.on_commit(
+            lambda: _submit(source, thumbnail, geometry_string, options)
+        )
+        return source
+
+
+def prefetch(images):
+    """Загружает записи KV-хранилища о миниатюрах картинок страницы.
+
+    Хранилище sorl ищет каждую миниатюру отдельно, в кеше, а при
+    промахе в базе. Здесь кеш читается одним get_many, промахи — одним
+    запросом к базе, а найденное и ненайденное кладётся в кеш, поэтому
+    ready() и тег {% thumbnail %} дальше обходятся без базы.
+    """
+    images = [image for image in images if image]
+    backend = default.backend
+    if not (
+        images and settings.POST_IMAGES_IN_TASKS
+        and isinstance(backend, PrerenderThumbnailBackend)
+        and isinstance(default.kvstore, CachedDbKVStore)
+    ):
+        return
+    kv_cache = default.kvstore.cache
+    keys = [
+        add_prefix(backend.prepare(image, geometry, **options)[1].key)
+        for image in images
+        for geometry, options in settings.POST_THUMBNAILS
+    ]
+    missing = set(keys) - kv_cache.get_many(keys).keys()
+    if not missing:
+        return
+    found = dict(KVStoreModel.objects.filter(
+        key__in=missing
+    ).values_list('key', 'value'))
+    kv_cache.set_many(
+        {key: found.get(key, EMPTY_VALUE) for key in missing},
+        sorl_settings.THUMBNAIL_CACHE_TIMEOUT,
+    )
+
+
+def ready(image):
+    """Готовы ли все миниатюры из POST_THUMBNAILS для картинки."""
+    if not image or not settings.POST_IMAGES_IN_TASKS:
+        return True
+    backend = default.backend
+    if not isinstance(backend, PrerenderThumbnailBackend):
+        return True
+    return all(
+        default.kvstore.get(backend.prepare(image, geometry, **options)[1])
+        for geometry, options in settings.POST_THUMBNAILS
+    )
+
+
+def prerender(image):
+    """Ставит в очередь все миниатюры из POST_THUMBNAILS."""
+    if not image or not settings.POST_IMAGES_IN_TASKS:
+        return
+    for geometry_string, options in settings.POST_THUMBNAILS:
+        default.backend.get_thumbnail(image, geometry_string, **options)
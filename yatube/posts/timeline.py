@@ -0,0 +1,185 @@
+"""Материализованная лента подписок.
+
+Посты обычных авторов при создании раскладываются в TimelineEntry
+каждого подписчика вместе с датой поста. Посты авторов, у которых
+подписчиков больше TIMELINE_FANOUT_LIMIT, не раскладываются
+(fanned_out=False) и подмешиваются в ленту при чтении (см. Timeline).
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, IntegerField, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Follow, Post, Profile, TimelineEntry, User
+from posts.paginators import key_after
+
+
+def is_fan_out_allowed(author_id):
+    followers = Profile.objects.filter(
+        user_id=author_id
+    ).values_list('follower_count', flat=True).first()
+    return (followers or 0) <= settings.TIMELINE_FANOUT_LIMIT
+
+
+def _bulk_insert(entries):
+    while True:
+        batch = list(islice(entries, settings.TIMELINE_BATCH_SIZE))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+@transaction.atomic
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post.pk, created=post.created)
+        for user_id in followers.iterator()
+    )
+
+
+@transaction.atomic
+def backfill_authors(user_id, author_ids):
+    """Переносит разосланные посты авторов в ленту подписчика."""
+    posts = Post.objects.filter(
+        author_id__in=author_ids,
+        fanned_out=True
+    ).values_list('pk', 'created')
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post_id, created=created)
+        for post_id, created in posts.iterator()
+    )
+
+
+def backfill(follow):
+    """Переносит разосланные посты автора в ленту нового подписчика."""
+    backfill_authors(follow.user_id, [follow.author_id])
+
+
+def drop_authors(user_id, author_ids):
+    """Убирает посты авторов из ленты пользователя."""
+    TimelineEntry.objects.filter(
+        user_id=user_id,
+        post__author_id__in=author_ids
+    ).delete()
+
+
+def drop(follow):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    drop_authors(follow.user_id, [follow.author_id])
+
+
+def _ordering(descending, *fields):
+    return [
+        F(field).desc() if descending else F(field).asc()
+        for field in fields
+    ]
+
+
+class Timeline:
+    """Лента подписок пользователя для пагинаторов.
+
+    Записи TimelineEntry читаются по индексу (user, -created, -post)
+    уже в порядке ленты, посты неразосланных авторов — отдельным
+    запросом. Каждая выборка ограничена концом нужной страницы, и
+    они сливаются по (created, id). Paginator берёт страницу срезом,
+    CursorPaginator — через keyset_rows().
+    """
+    ordered = True
+
+    def __init__(self, user, posts=None):
+        self.user = user
+        self.posts = Post.objects.all() if posts is None else posts
+
+    def select_related(self, *fields):
+        return Timeline(self.user, self.posts.select_related(*fields))
+
+    def only(self, *fields):
+        return Timeline(self.user, self.posts.only(*fields))
+
+    def _not_fanned_out(self):
+        return self.posts.filter(
+            fanned_out=False,
+            author__in=Follow.objects.filter(user=self.user).values('author')
+        )
+
+    def count(self):
+        """Число постов ленты одним запросом с двумя подзапросами."""
+        entries = TimelineEntry.objects.filter(
+            user=self.user
+        ).order_by().values('user').annotate(total=Count('pk'))
+        others = self._not_fanned_out().order_by().values(
+            'fanned_out'
+        ).annotate(total=Count('pk'))
+        total = IntegerField()
+        return sum(User.objects.filter(pk=self.user.pk).annotate(
+            entries=Coalesce(
+                Subquery(entries.values('total'), output_field=total), 0
+            ),
+            others=Coalesce(
+                Subquery(others.values('total'), output_field=total), 0
+            ),
+        ).values_list('entries', 'others').get())
+
+    def keyset_rows(self, limit, key=None, descending=True, offset=0):
+        """limit постов после ключа (created, id), пропустив offset."""
+        entry = Q(timeline__user=self.user)
+        other = Q()
+        if key is not None:
+            entry &= key_after(
+                *key, descending, ('timeline__created', 'timeline__post')
+            )
+            other = key_after(*key, descending)
+        end = offset + limit
+        # Все условия на запись в одном filter(), иначе Django добавит
+        # для них второй JOIN. F() сортирует по самому столбцу post_id,
+        # а не по сортировке Post по умолчанию.
+        entries = self.posts.filter(entry).order_by(
+            *_ordering(descending, 'timeline__created', 'timeline__post')
+        )[:end]
+        others = self._not_fanned_out().filter(other).order_by(
+            *_ordering(descending, 'created', 'pk')
+        )[:end]
+        rows = heapq.merge(
+            entries, others,
+            key=lambda post: (post.created, post.pk),
+            reverse=descending,
+        )
+        return list(islice(rows, offset, end))
+
+    def __getitem__(self, page):
+        start = page.start or 0
+        return self.keyset_rows(page.stop - start, offset=start)
+
+
+def timeline_posts(user):
+    """Посты ленты подписок пользователя."""
+    return Timeline(user)
+
+
+def rebuild():
+    """Заново раскладывает посты по лентам, например после bulk_create."""
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    TimelineEntry.objects.all().delete()
+    Post.objects.update(fanned_out=False)
+    Post.objects.filter(
+        author__profile__follower_count__lte=limit
+    ).update(fanned_out=True)
+    # INSERT ... SELECT: миллионы записей не проходят через Python.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            f'(user_id, post_id, created) '
+            f'SELECT follow.user_id, post.id, post.created '
+            f'FROM {Follow._meta.db_table} follow '
+            f'JOIN {Post._meta.db_table} post '
+            f'ON post.author_id = follow.author_id '
+            f'WHERE post.fanned_out = %s',
+            [True]
+        )
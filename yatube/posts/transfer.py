@@ -0,0 +1,324 @@
+"""Потоковые выгрузка и загрузка постов в формате NDJSON.
+
+Каждая строка файла — одна запись с полем model: group, post, comment
+или follow. Пользователи и группы указываются естественными ключами
+(username и slug), посты — своим id из исходной базы. export() читает
+таблицы итератором на стороне сервера и держит в памяти только текущую
+пачку, Importer пишет пачками через bulk_create и тоже не копит ключи
+между пачками.
+"""
+import gzip
+import json
+import sys
+from collections import Counter
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.db import DatabaseError, connection
+from django.utils.dateparse import parse_datetime
+
+from core.db import bulk_insert
+from posts import counters, images, search, timeline
+from posts.feed_cache import bump_feed_version
+from posts.models import Comment, Follow, Group, Post, User
+
+FIELDS = {
+    'group': ('slug', 'title', 'description'),
+    'post': ('id', 'created', 'author', 'group', 'text', 'image'),
+    'comment': ('post', 'created', 'author', 'text'),
+    'follow': ('user', 'author'),
+}
+MODELS = tuple(FIELDS)
+# Временная таблица соответствия id постов из файла новым id
+POST_IDS = 'transfer_post_ids'
+
+
+class BatchError(ValueError):
+    """Пачку не удалось записать, в сообщении строки файла пачки."""
+
+
+@contextmanager
+def open_stream(path, mode):
+    """Файл, файл .gz или stdin/stdout для '-'."""
+    if path == '-':
+        yield sys.stdin if mode == 'r' else sys.stdout
+    elif path.endswith('.gz'):
+        with gzip.open(path, f'{mode}t', encoding='utf-8') as file:
+            yield file
+    else:
+        with open(path, mode, encoding='utf-8') as file:
+            yield file
+
+
+def _date(value):
+    # parse_datetime возвращает None для строки не в формате ISO 8601,
+    # а auto_now_add подставил бы вместо неё время загрузки.
+    created = parse_datetime(value)
+    if created is None:
+        raise ValueError(f'Неверная дата {value!r}')
+    return created
+
+
+def _rows(queryset, fields, batch_size):
+    return queryset.order_by('pk').values_list(*fields).iterator(
+        chunk_size=batch_size
+    )
+
+
+def export(models=MODELS, batch_size=5000):
+    """Строки NDJSON по моделям в порядке зависимостей."""
+    if 'group' in models:
+        for slug, title, description in _rows(
+            Group.objects, ('slug', 'title', 'description'), batch_size
+        ):
+            yield {
+                'model': 'group',
+                'slug': slug,
+                'title': title,
+                'description': description,
+            }
+    if 'post' in models:
+        for pk, created, author, group, text, image in _rows(
+            Post.objects,
+            ('pk', 'created', 'author__username', 'group__slug',
+             'text', 'image'),
+            batch_size
+        ):
+            yield {
+                'model': 'post',
+                'id': pk,
+                'created': created.isoformat(),
+                'author': author,
+                'group': group,
+                'text': text,
+                'image': image or None,
+            }
+    if 'comment' in models:
+        for post, created, author, text in _rows(
+            Comment.objects,
+            ('post_id', 'created', 'author__username', 'text'),
+            batch_size
+        ):
+            yield {
+                'model': 'comment',
+                'post': post,
+                'created': created.isoformat(),
+                'author': author,
+                'text': text,
+            }
+    if 'follow' in models:
+        for user, author in _rows(
+            Follow.objects,
+            ('user__username', 'author__username'),
+            batch_size
+        ):
+            yield {'model': 'follow', 'user': user, 'author': author}
+
+
+def dump(records, file):
+    count = 0
+    for record in records:
+        file.write(json.dumps(record, ensure_ascii=False,
+                              separators=(',', ':')))
+        file.write('\n')
+        count += 1
+    return count
+
+
+def rebuild_derived():
+    """Пересобирает то, что bulk_create не обновляет сигналами."""
+    counters.recount_profiles()
+    counters.recount_posts()
+    counters.recount_groups()
+    images.recount_refs()
+    timeline.rebuild()
+    search.get_backend().rebuild()
+    bump_feed_version()
+
+
+class Importer:
+    """Загружает записи export() пачками с переназначением ключей.
+
+    Отсутствующие пользователи создаются без пароля, существующие
+    группы с тем же slug переиспользуются. Посты получают новые id от
+    базы, а соответствие id из файла новым хранится не в памяти, а во
+    временной таблице POST_IDS соединения, по ней привязываются
+    комментарии. Пользователи, группы и посты ищутся в базе для каждой
+    пачки. Повторная загрузка того же файла создаёт копии постов.
+    """
+
+    def __init__(self, batch_size=5000, log=None):
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.buffers = {model: [] for model in MODELS}
+        # Номера первой и последней строки файла в каждом буфере
+        self.lines = {}
+        self.stats = Counter()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {POST_IDS}')
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {POST_IDS} '
+                f'(source_id bigint PRIMARY KEY, post_id bigint NOT NULL)'
+            )
+
+    def _post_ids(self, source_ids):
+        source_ids = list(set(source_ids))
+        if not source_ids:
+            return {}
+        placeholders = ', '.join(['%s'] * len(source_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT source_id, post_id FROM {POST_IDS} '
+                f'WHERE source_id IN ({placeholders})',
+                source_ids,
+            )
+            return dict(cursor.fetchall())
+
+    def _user_ids(self, usernames):
+        usernames = set(usernames)
+        users = dict(User.objects.filter(
+            username__in=usernames
+        ).values_list('username', 'pk'))
+        new = usernames - users.keys()
+        if new:
+            User.objects.bulk_create(
+                User(username=username, password=make_password(None))
+                for username in new
+            )
+            users.update(User.objects.filter(
+                username__in=new
+            ).values_list('username', 'pk'))
+            self.stats['user'] += len(new)
+        return users
+
+    def _group_ids(self, slugs):
+        return dict(Group.objects.filter(
+            slug__in=set(slugs) - {None}
+        ).values_list('slug', 'pk'))
+
+    def _groups(self, records):
+        slugs = self._group_ids(record['slug'] for record in records)
+        new = {
+            record['slug']: record
+            for record in records if record['slug'] not in slugs
+        }
+        Group.objects.bulk_create(
+            Group(
+                slug=record['slug'],
+                title=record['title'],
+                description=record['description'],
+            )
+            for record in new.values()
+        )
+        self.stats['group'] += len(new)
+
+    def _posts(self, records):
+        users = self._user_ids(record['author'] for record in records)
+        groups = self._group_ids(record['group'] for record in records)
+        posts = bulk_insert(Post, (
+            Post(
+                created=_date(record['created']),
+                author_id=users[record['author']],
+                group_id=groups.get(record['group']),
+                text=record['text'],
+                image=record['image'] or '',
+            )
+            for record in records
+        ))
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {POST_IDS} (source_id, post_id) '
+                f'VALUES (%s, %s)',
+                [
+                    (record['id'], post.pk)
+                    for record, post in zip(records, posts)
+                ],
+            )
+        self.stats['post'] += len(records)
+
+    def _comments(self, records):
+        total = len(records)
+        # Комментарии привязываются только к постам из этого файла.
+        posts = self._post_ids(record['post'] for record in records)
+        records = [record for record in records if record['post'] in posts]
+        self.stats['skipped'] += total - len(records)
+        users = self._user_ids(record['author'] for record in records)
+        bulk_insert(Comment, (
+            Comment(
+                post_id=posts[record['post']],
+                created=_date(record['created']),
+                author_id=users[record['author']],
+                text=record['text'],
+            )
+            for record in records
+        ))
+        self.stats['comment'] += len(records)
+
+    def _follows(self, records):
+        users = self._user_ids(
+            name for record in records
+            for name in (record['user'], record['author'])
+        )
+        follows = [
+            Follow(
+                user_id=users[record['user']],
+                author_id=users[record['author']],
+            )
+            for record in records if record['user'] != record['author']
+        ]
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        self.stats['follow'] += len(follows)
+        self.stats['skipped'] += len(records) - len(follows)
+
+    def flush(self):
+        handlers = {
+            'group': self._groups,
+            'post': self._posts,
+            'comment': self._comments,
+            'follow': self._follows,
+        }
+        for model in MODELS:
+            if not self.buffers[model]:
+                continue
+            try:
+                handlers[model](self.buffers[model])
+            except (KeyError, TypeError, ValueError, DatabaseError) as error:
+                first, last = self.lines.get(model, (None, None))
+                where = f'Строки {first}-{last}' if first else 'Пачка'
+                raise BatchError(
+                    f'{where}: {type(error).__name__}: {error}'
+                ) from error
+            self.buffers[model] = []
+            self.lines.pop(model, None)
+
+    def add(self, record, line=None):
+        model = record.get('model') if isinstance(record, dict) else None
+        if model not in FIELDS:
+            raise ValueError(f'Неизвестная модель: {model!r}')
+        missing = [field for field in FIELDS[model] if field not in record]
+        if missing:
+            raise ValueError(f'Нет полей {", ".join(missing)}')
+        buffer = self.buffers[model]
+        buffer.append(record)
+        if line is not None:
+            self.lines[model] = (self.lines.get(model, (line,))[0], line)
+        if len(buffer) >= self.batch_size:
+            # Записи, от которых зависит пачка, должны попасть в базу
+            # раньше неё.
+            self.flush()
+            self.log(f'Загружено: {dict(self.stats)}')
+
+    def load(self, lines):
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                self.add(json.loads(line), number)
+            except BatchError:
+                raise
+            except ValueError as error:
+                raise ValueError(f'Строка {number}: {error}')
+        self.flush()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {POST_IDS}')
+        return self.stats
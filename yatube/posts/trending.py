@@ -0,0 +1,116 @@
+"""Популярные посты и группы по затухающей оценке активности.
+
+update() запускается периодически (manage.py update_trending) и
+обрабатывает только события после предыдущего запуска:
+
+1. все сохранённые оценки умножаются на 0.5 ** (прошло / полураспад)
+   одним UPDATE, оценки ниже TRENDING_MIN_SCORE удаляются;
+2. к оценкам добавляются события окна: новый пост (POST), новые
+   комментарии к посту (COMMENT) и новые подписчики автора (FOLLOW),
+   которые достаются его постам моложе TRENDING_WINDOW;
+3. оценка группы растёт на сумму прибавок её постов.
+
+Внутри окна события не затухают, поэтому интервал запуска должен быть
+заметно меньше TRENDING_HALF_LIFE. Первый запуск учитывает события за
+TRENDING_WINDOW. Страница популярного читает готовые оценки и
+кешируется до следующего запуска или изменения постов.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from posts.feed_cache import bump_trending_version
+from posts.models import (
+    Comment, Follow, Post, TrendingGroup, TrendingPost, TrendingRun
+)
+
+
+def _decay(model, factor):
+    model.objects.update(score=F('score') * factor)
+    model.objects.filter(score__lt=settings.TRENDING_MIN_SCORE).delete()
+
+
+def _increments(since, until):
+    """Прибавки оценок постов и групп за окно (since, until]."""
+    weights = settings.TRENDING_WEIGHTS
+    window = {'created__gt': since, 'created__lte': until}
+    posts, groups = Counter(), Counter()
+
+    def add(post_id, group_id, value):
+        posts[post_id] += value
+        if group_id is not None:
+            groups[group_id] += value
+
+    for post_id, group_id in Post.objects.filter(**window).values_list(
+        'pk', 'group_id'
+    ).iterator():
+        add(post_id, group_id, weights['post'])
+    for post_id, group_id, count in Comment.objects.filter(
+        **window
+    ).values('post_id', 'post__group_id').annotate(
+        count=Count('pk')
+    ).values_list('post_id', 'post__group_id', 'count'):
+        add(post_id, group_id, weights['comment'] * count)
+    followers = dict(Follow.objects.filter(**window).values(
+        'author_id'
+    ).annotate(count=Count('pk')).values_list('author_id', 'count'))
+    if followers:
+        for post_id, group_id, author_id in Post.objects.filter(
+            author_id__in=followers,
+            created__gt=until - settings.TRENDING_WINDOW,
+        ).values_list('pk', 'group_id', 'author_id').iterator():
+            add(post_id, group_id, weights['follow'] * followers[author_id])
+    return posts, groups
+
+
+def _add(model, key, increments):
+    existing = model.objects.in_bulk(list(increments))
+    for pk, row in existing.items():
+        row.score += increments[pk]
+    model.objects.bulk_update(existing.values(), ['score'])
+    model.objects.bulk_create(
+        model(**{key: pk, 'score': score})
+        for pk, score in increments.items() if pk not in existing
+    )
+
+
+@transaction.atomic
+def update(now=None):
+    """Учитывает события после прошлого запуска.
+
+    Возвращает прибавки оценок постов за окно.
+    """
+    until = now or timezone.now()
+    last = TrendingRun.objects.select_for_update().first()
+    if last is None:
+        last = TrendingRun(until=until - settings.TRENDING_WINDOW)
+    since = last.until
+    if until <= since:
+        return {}
+    elapsed = (until - since) / settings.TRENDING_HALF_LIFE
+    for model in (TrendingPost, TrendingGroup):
+        _decay(model, 0.5 ** elapsed)
+
+    posts, groups = _increments(since, until)
+    _add(TrendingPost, 'post_id', posts)
+    _add(TrendingGroup, 'group_id', groups)
+
+    last.until = until
+    last.save()
+    transaction.on_commit(bump_trending_version)
+    return posts
+
+
+def top_posts(limit=None):
+    return Post.objects.filter(trending__isnull=False).select_related(
+        'author', 'group'
+    ).order_by('-trending__score', '-pk')[:limit or settings.TRENDING_SHOWN]
+
+
+def top_groups(limit=None):
+    return TrendingGroup.objects.select_related('group').order_by(
+        '-score', '-pk'
+    )[:limit or settings.TRENDING_SHOWN]
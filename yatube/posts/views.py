@@ -1,70 +1,166 @@
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 
-from posts.models import Follow, Post, Group, User
+from posts import comment_queue
+from posts.models import Comment, Follow, Post, Group, User
 from posts.forms import PostForm, GroupForm, CommentForm
+from posts.feed_cache import feed_cache, trending_version
+from posts.follow_graph import is_following
+from posts.paginators import CursorPaginator, keyset_chunk
+from posts.search import get_backend
+from posts.suggestions import suggested
+from posts.trending import top_groups, top_posts
+from posts.timeline import timeline_posts
 
 
 def paginator_function(
         objects,
         page_number,
         page_amount=settings.POSTS_AMOUNT):
-    paginator = Paginator(objects, page_amount)
+    if settings.POSTS_PAGINATION == 'cursor':
+        paginator = CursorPaginator(objects, page_amount)
+    else:
+        paginator = Paginator(objects, page_amount)
     return paginator.get_page(page_number)
 
 
+def comment_chunk(comments, request):
+    """Порция комментариев по параметрам cursor и order запроса."""
+    return keyset_chunk(
+        comments,
+        settings.COMMENTS_AMOUNT,
+        request.GET.get('cursor'),
+        oldest_first=request.GET.get('order') == 'oldest',
+    )
+
+
 def index(request):
     posts = Post.objects.select_related('author', 'group')
-    page_number = request.GET.get('page')
+    page_obj = paginator_function(posts, request.GET.get('page'))
     context = {
-        'page_obj': paginator_function(posts, page_number),
+        'page_obj': page_obj,
+        # Ключ по номеру из пагинатора: сырой ?page= давал бы новую
+        # запись кеша на каждую строку.
+        'feed_cache': feed_cache('index', page_obj.number),
     }
     return render(request, 'posts/index.html', context)
 
 
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('profile'),
+        username=username
+    )
     posts = author.posts.select_related('group')
-    page_number = request.GET.get('page')
-    status = (request.user.is_authenticated
-              and author.following.filter(user=request.user).exists())
+    page_obj = paginator_function(posts, request.GET.get('page'))
+    status = is_following(request.user, author.pk)
 
     context = {
         'author': author,
-        'page_obj': paginator_function(posts, page_number),
+        'page_obj': page_obj,
+        'feed_cache': feed_cache('profile', author.pk, page_obj.number),
         'following': status,
+        'suggestions': suggested(request.user),
     }
     return render(request, 'posts/profile.html', context)
 
 
 def post_detail(request, post_id):
     post = get_object_or_404(
-        Post.objects.select_related('author', 'group'),
+        Post.objects.select_related('author__profile', 'group'),
         id=post_id
     )
-    comments = post.comments.select_related('author')
+    comments, comments_next = comment_chunk(
+        post.comments.select_related('author'), request
+    )
+    order = request.GET.get('order', 'newest')
+    # Свои комментарии из очереди показываются там, где появятся после
+    # переноса: в начале новых или в конце старых.
+    if order == 'oldest':
+        edge = comments_next is None
+    else:
+        edge = not request.GET.get('cursor')
     context = {
         'post': post,
+        'post_id': post.pk,
         'form': CommentForm(),
-        'comments': comments
+        'comments': comments,
+        'comments_next': comments_next,
+        'comments_order': order,
+        'pending_comments': (
+            comment_queue.pending(request.user, post.pk) if edge else []
+        ),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """Следующая порция комментариев поста фрагментом HTML."""
+    comments, comments_next = comment_chunk(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        request
+    )
+    if not comments and not Post.objects.filter(id=post_id).exists():
+        raise Http404('Пост не найден')
+    context = {
+        'post_id': post_id,
+        'comments': comments,
+        'comments_next': comments_next,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('author')
-    page_number = request.GET.get('page')
+    page_obj = paginator_function(posts, request.GET.get('page'))
     context = {
         'group': group,
-        'page_obj': paginator_function(posts, page_number),
+        'page_obj': page_obj,
+        'feed_cache': feed_cache('group', group.pk, page_obj.number),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+def groups(request):
+    """Все группы: сначала те, где недавно писали, пустые в конце."""
+    groups = Group.objects.order_by(
+        F('last_post_at').desc(nulls_last=True), '-id'
+    )
+    paginator = Paginator(groups, settings.GROUPS_AMOUNT)
+    context = {
+        'page_obj': paginator.get_page(request.GET.get('page')),
+    }
+    return render(request, 'posts/groups.html', context)
+
+
+def trending(request):
+    context = {
+        'posts': top_posts(),
+        'groups': top_groups(),
+        'feed_cache': feed_cache('trending', trending_version()),
+    }
+    return render(request, 'posts/trending.html', context)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(get_backend().search(query), settings.POSTS_AMOUNT)
+    context = {
+        'query': query,
+        'page_obj': paginator.get_page(request.GET.get('page')),
+        'page_params': {'q': query},
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
 
@@ -99,6 +195,7 @@ def group_create(request):
 
 
 @login_required
+@transaction.atomic
 def post_edit(request, post_id):
     post = get_object_or_404(
         Post.objects.select_related('author', 'group'),
@@ -127,30 +224,36 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
-        comment = form.save(commit=False)
-        comment.author = request.user
-        comment.post = post
-        comment.save()
+        if settings.COMMENTS_WRITE_BEHIND:
+            comment_queue.enqueue(
+                post.pk, request.user, form.cleaned_data['text']
+            )
+        else:
+            comment = form.save(commit=False)
+            comment.author = request.user
+            comment.post = post
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(
-        author__following__user=request.user
-    ).select_related('author', 'group')
+    posts = timeline_posts(request.user).select_related('author', 'group')
     page_number = request.GET.get('page')
     context = {
-        'page_obj': paginator_function(posts, page_number)
+        'page_obj': paginator_function(posts, page_number),
+        'suggestions': suggested(request.user),
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
@@ -162,9 +265,10 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.get(
+    Follow.objects.filter(
         user=request.user,
         author=author
     ).delete()
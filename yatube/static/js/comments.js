@@ -0,0 +1,24 @@
+// Кнопка «Показать ещё» под комментариями подгружает следующую порцию
+// фрагментом HTML на место себя. Без скриптов ссылка ведёт на страницу
+// поста с той же порцией.
+document.addEventListener('click', function (event) {
+  var link = event.target.closest('[data-comments-more]');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  fetch(link.getAttribute('data-comments-more'), {credentials: 'same-origin'})
+    .then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.status);
+      }
+      return response.text();
+    })
+    .then(function (html) {
+      link.insertAdjacentHTML('beforebegin', html);
+      link.remove();
+    })
+    .catch(function () {
+      window.location = link.href;
+    });
+});
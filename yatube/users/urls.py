@@ -5,6 +5,7 @@ from django.contrib.auth.views import (
 from django.urls import path
 
 from users import views
+from users.forms import BackgroundPasswordResetForm
 
 
 app_name = 'users'
@@ -57,6 +58,7 @@ urlpatterns = [
     path(
         'password_reset/',
         PasswordResetView.as_view(
+            form_class=BackgroundPasswordResetForm,
             template_name='users/password_reset_form.html'
         ),
         name='password_reset'
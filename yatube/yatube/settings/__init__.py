@@ -0,0 +1,12 @@
+"""Профиль настроек выбирается переменной окружения YATUBE_ENV.
+
+dev (по умолчанию) — локальная разработка и тесты, prod — боевой
+профиль, настраиваемый переменными окружения, см. yatube/settings/prod.py.
+Профиль можно выбрать и напрямую через DJANGO_SETTINGS_MODULE.
+"""
+import os
+
+if os.environ.get('YATUBE_ENV', 'dev') == 'prod':
+    from yatube.settings.prod import *  # noqa: F401,F403
+else:
+    from yatube.settings.dev import *  # noqa: F401,F403
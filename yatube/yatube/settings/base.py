@@ -0,0 +1,292 @@
+"""
+Django settings for yatube project: common part of the dev and prod profiles.
+
+Generated by 'django-admin startproject' using Django 2.2.19.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/2.2/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/2.2/ref/settings/
+"""
+
+import os
+from datetime import timedelta
+
+# Build paths inside the project like this: os.path.join(BASE_DIR, ...)
+BASE_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+
+CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+# Application definition
+
+INSTALLED_APPS = [
+    'posts.apps.PostsConfig',
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'users.apps.UsersConfig',
+    'core.apps.CoreConfig',
+    'about.apps.AboutConfig',
+    'sorl.thumbnail',
+]
+
+MIDDLEWARE = [
+    'core.middleware.QueryBudgetMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'yatube.urls'
+
+TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [TEMPLATES_DIR],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+                'core.context_processors.year.year',
+            ],
+        },
+    },
+]
+
+MEDIA_URL = '/media/'
+
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+WSGI_APPLICATION = 'yatube.wsgi.application'
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+LOGIN_URL = 'users:login'
+
+LOGIN_REDIRECT_URL = 'posts:index'
+
+EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+
+EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+
+# Database
+# https://docs.djangoproject.com/en/2.2/ref/settings/#databases
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+    }
+}
+
+# Проверять постоянные соединения перед каждым запросом,
+# см. core.db.close_unusable_connections
+DB_HEALTH_CHECKS = False
+
+# Password validation
+# https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/2.2/topics/i18n/
+
+LANGUAGE_CODE = 'ru-ru'
+
+TIME_ZONE = 'Europe/Moscow'
+
+USE_I18N = True
+
+USE_L10N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/2.2/howto/static-files/
+
+STATIC_URL = '/static/'
+
+STATICFILES_DIRS = [
+    os.path.join(BASE_DIR, 'static')
+]
+
+
+# Constants
+
+POSTS_AMOUNT = 10
+
+GROUPS_AMOUNT = 20
+
+# Комментарии на странице поста и в каждой следующей порции
+COMMENTS_AMOUNT = 20
+
+# Принимать комментарии в очередь, которую переносит в базу пачками
+# команда drain_comments --loop, см. posts.comment_queue. После
+# выключения очередь стоит дочистить той же командой.
+COMMENTS_WRITE_BEHIND = False
+
+COMMENTS_QUEUE_BATCH = 500
+
+# Пауза drain_comments --loop при пустой очереди, в секундах
+COMMENTS_QUEUE_INTERVAL = 1
+
+# 'offset' - номера страниц, 'cursor' - курсоры по (created, id)
+POSTS_PAGINATION = 'offset'
+PAGINATOR_ON_EACH_SIDE = 3
+PAGINATOR_ON_ENDS = 2
+
+# Авторы с большим числом подписчиков не раскладываются в ленты при записи
+TIMELINE_FANOUT_LIMIT = 1000
+
+TIMELINE_BATCH_SIZE = 1000
+
+# Кеш фрагментов лент index, group_posts и profile
+FEED_CACHE_ENABLED = True
+
+FEED_CACHE_TIMEOUT = 60 * 5
+
+# Разметка отдельного поста, общая для всех лент
+POST_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Подписки пользователя кешируются целиком, если их не больше лимита
+FOLLOW_GRAPH_CACHE_LIMIT = 10_000
+
+FOLLOW_GRAPH_CACHE_TIMEOUT = 60 * 60
+
+FOLLOW_BULK_LIMIT = 1000
+
+# Рекомендации подписок, см. manage.py build_suggestions
+SUGGESTIONS_TOP_K = 20
+
+SUGGESTIONS_SHOWN = 5
+
+SUGGESTIONS_FOLLOW_WEIGHT = 1.0
+
+SUGGESTIONS_GROUP_WEIGHT = 0.5
+
+SUGGESTIONS_HUB_LIMIT = 1000
+
+# Популярное, см. manage.py update_trending. Запускать заметно чаще,
+# чем раз в TRENDING_HALF_LIFE.
+TRENDING_HALF_LIFE = timedelta(hours=6)
+
+# Окно первого расчёта и возраст постов, которым достаются подписчики
+TRENDING_WINDOW = timedelta(days=3)
+
+TRENDING_WEIGHTS = {'post': 1.0, 'comment': 2.0, 'follow': 0.5}
+
+TRENDING_MIN_SCORE = 0.01
+
+TRENDING_SHOWN = 10
+
+# Миниатюры картинок постов готовятся задачами core.tasks после
+# сохранения поста, пока миниатюры нет, шаблон показывает оригинал.
+# POST_IMAGES_IN_TASKS = False возвращает рендеринг внутри запроса.
+THUMBNAIL_BACKEND = 'posts.thumbnails.PrerenderThumbnailBackend'
+
+POST_THUMBNAILS = [
+    ('960x339', {'crop': 'center', 'upscale': True}),
+]
+
+POST_IMAGES_IN_TASKS = True
+
+# Загруженные картинки проверяются по размеру файла и разрешению, затем
+# задачей core.tasks пересжимаются без EXIF.
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+
+POST_IMAGE_MAX_PIXELS = 40_000_000
+
+# Длинная сторона пересжатой картинки
+POST_IMAGE_MAX_SIZE = 1920
+
+# 'JPEG' или 'WEBP', если Pillow собран с WebP
+POST_IMAGE_FORMAT = 'JPEG'
+
+POST_IMAGE_QUALITY = 85
+
+# Для баз без FTS5: 'posts.search.ContainsSearchBackend'
+POSTS_SEARCH_BACKEND = 'posts.search.SQLiteSearchBackend'
+
+# Бюджет SQL-запросов на view, см. core.middleware.QueryBudgetMiddleware.
+# Страница с картинками при холодном кеше тратит ещё один запрос на
+# миниатюры (см. posts.thumbnails.prefetch), сколько бы картинок на ней
+# ни было.
+QUERY_BUDGETS = {
+    'posts:index': 5,
+    'posts:group_list': 6,
+    'posts:groups': 4,
+    'posts:profile': 8,
+    'posts:post_detail': 6,
+    'posts:post_comments': 4,
+    'posts:follow_index': 7,
+    'posts:search': 6,
+    'posts:trending': 4,
+    'posts:api_index': 3,
+    'posts:api_group_list': 4,
+    'posts:api_profile': 4,
+    'posts:api_post_detail': 4,
+    'posts:api_post_comments': 3,
+    'posts:api_follow_index': 5,
+}
+
+# Замеры идут только при разработке: заголовки X-DB-* не нужны клиентам
+QUERY_BUDGET_ENABLED = False
+
+QUERY_BUDGET_RAISE = False
+
+QUERY_REPEAT_THRESHOLD = 3
+
+# Фоновые задачи core.tasks: ThreadPoolBackend выполняет их в потоках
+# процесса, DatabaseBackend ставит в таблицу, которую разбирает
+# manage.py run_tasks, ImmediateBackend — сразу после транзакции.
+TASKS_BACKEND = 'core.tasks.ThreadPoolBackend'
+
+TASKS_WORKERS = 2
+
+# Число повторов упавшей задачи и пауза перед первым, в секундах,
+# дальше пауза удваивается
+TASKS_RETRIES = 3
+
+TASKS_BACKOFF = 1
+
+# Сколько задача из таблицы закреплена за взявшим её процессом
+TASKS_LEASE = timedelta(minutes=5)
+
+# Пауза run_tasks при пустой очереди, в секундах
+TASKS_POLL_INTERVAL = 1
+
+TASKS_PROCESSES = 1
+
+# Результаты manage.py benchmark_feeds
+BENCHMARK_DIR = os.path.join(BASE_DIR, 'benchmarks')
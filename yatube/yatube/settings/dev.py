@@ -0,0 +1,30 @@
+"""Профиль для локальной разработки и тестов."""
+from yatube.settings.base import *  # noqa: F401,F403
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = 'ii6)x1)@3ep63-kz5m6f6pal@yy3rzew@_s@4thf$8xtndb^rd'
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = True
+
+ALLOWED_HOSTS = [
+    'localhost',
+    '127.0.0.1',
+    '[::1]',
+    'testserver',
+]
+
+QUERY_BUDGET_ENABLED = True
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Тесты идут на SQLite в памяти с общим кешем, где второй пишущий поток
+# сразу получает «table is locked», поэтому задачи выполняются после
+# фиксации в потоке запроса, а повторы не ждут.
+TASKS_BACKEND = 'core.tasks.ImmediateBackend'
+
+TASKS_BACKOFF = 0
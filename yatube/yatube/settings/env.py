@@ -0,0 +1,32 @@
+"""Чтение настроек из переменных окружения."""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+TRUE = ('1', 'true', 'yes', 'on')
+
+
+def env(name, default=None, required=False):
+    value = os.environ.get(name)
+    if value is None or value == '':
+        if required:
+            raise ImproperlyConfigured(f'Не задана переменная окружения {name}')
+        return default
+    return value
+
+
+def env_bool(name, default=False):
+    value = env(name)
+    return default if value is None else value.lower() in TRUE
+
+
+def env_int(name, default=None):
+    value = env(name)
+    return default if value is None else int(value)
+
+
+def env_list(name, default=()):
+    value = env(name)
+    if value is None:
+        return list(default)
+    return [item.strip() for item in value.split(',') if item.strip()]
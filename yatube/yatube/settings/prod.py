@@ -0,0 +1,163 @@
+"""Боевой профиль: параметры берутся из переменных окружения.
+
+Обязательные: SECRET_KEY и ALLOWED_HOSTS (через запятую).
+
+База: DB_ENGINE (postgresql по умолчанию или sqlite3), DB_NAME,
+DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_CONN_MAX_AGE — сколько
+секунд держать соединение открытым между запросами, DB_HEALTH_CHECKS —
+проверять такие соединения перед запросом.
+
+Кеш общий для всех процессов: CACHE_BACKEND=file (по умолчанию) или
+redis (нужен пакет django-redis), адрес или каталог в CACHE_LOCATION.
+"""
+import copy
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from yatube.settings.base import *  # noqa: F401,F403
+from yatube.settings.base import BASE_DIR, TEMPLATES
+from yatube.settings.env import env, env_bool, env_int, env_list
+
+SECRET_KEY = env('SECRET_KEY', required=True)
+
+DEBUG = env_bool('DEBUG')
+
+ALLOWED_HOSTS = env_list('ALLOWED_HOSTS')
+
+if not ALLOWED_HOSTS:
+    raise ImproperlyConfigured('Не задана переменная окружения ALLOWED_HOSTS')
+
+# Database
+
+DB_ENGINE = env('DB_ENGINE', 'postgresql')
+
+DATABASES = {
+    'default': {
+        'ENGINE': f'django.db.backends.{DB_ENGINE}',
+        'NAME': env(
+            'DB_NAME',
+            os.path.join(BASE_DIR, 'db.sqlite3')
+            if DB_ENGINE == 'sqlite3' else 'yatube'
+        ),
+        'USER': env('DB_USER', ''),
+        'PASSWORD': env('DB_PASSWORD', ''),
+        'HOST': env('DB_HOST', ''),
+        'PORT': env('DB_PORT', ''),
+        'CONN_MAX_AGE': env_int('DB_CONN_MAX_AGE', 60),
+    }
+}
+
+DB_HEALTH_CHECKS = env_bool('DB_HEALTH_CHECKS', True)
+
+# Полнотекстовый индекс FTS5 есть только в SQLite
+POSTS_SEARCH_BACKEND = (
+    'posts.search.SQLiteSearchBackend' if DB_ENGINE == 'sqlite3'
+    else 'posts.search.ContainsSearchBackend'
+)
+
+# Cache
+
+CACHE_BACKENDS = {
+    'file': (
+        'django.core.cache.backends.filebased.FileBasedCache',
+        os.path.join(BASE_DIR, 'cache'),
+    ),
+    'redis': (
+        'django_redis.cache.RedisCache',
+        'redis://127.0.0.1:6379/1',
+    ),
+}
+
+CACHE_BACKEND = env('CACHE_BACKEND', 'file')
+
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(
+        f'CACHE_BACKEND: ожидается одно из {", ".join(CACHE_BACKENDS)}'
+    )
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': env('CACHE_LOCATION', CACHE_BACKENDS[CACHE_BACKEND][1]),
+        'KEY_PREFIX': env('CACHE_KEY_PREFIX', 'yatube'),
+    }
+}
+
+# Templates: скомпилированные шаблоны живут в памяти процесса
+
+TEMPLATES = copy.deepcopy(TEMPLATES)
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+# Static and media files
+
+STATIC_ROOT = env('STATIC_ROOT', os.path.join(BASE_DIR, 'static_root'))
+
+MEDIA_ROOT = env('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
+COMMENTS_WRITE_BEHIND = env_bool('COMMENTS_WRITE_BEHIND')
+
+TASKS_BACKEND = env('TASKS_BACKEND', 'core.tasks.DatabaseBackend')
+
+TASKS_PROCESSES = env_int('TASKS_PROCESSES', 2)
+
+POST_IMAGES_IN_TASKS = env_bool('POST_IMAGES_IN_TASKS', True)
+
+QUERY_BUDGET_ENABLED = env_bool('QUERY_BUDGET_ENABLED')
+
+POST_IMAGE_FORMAT = env('POST_IMAGE_FORMAT', 'JPEG')
+
+# Email
+
+EMAIL_BACKEND = env(
+    'EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend'
+)
+
+EMAIL_HOST = env('EMAIL_HOST', 'localhost')
+
+EMAIL_PORT = env_int('EMAIL_PORT', 25)
+
+EMAIL_HOST_USER = env('EMAIL_HOST_USER', '')
+
+EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD', '')
+
+EMAIL_USE_TLS = env_bool('EMAIL_USE_TLS')
+
+DEFAULT_FROM_EMAIL = env('DEFAULT_FROM_EMAIL', 'webmaster@localhost')
+
+# Security
+
+SESSION_COOKIE_SECURE = env_bool('SECURE_COOKIES', True)
+
+CSRF_COOKIE_SECURE = SESSION_COOKIE_SECURE
+
+SECURE_SSL_REDIRECT = env_bool('SECURE_SSL_REDIRECT')
+
+SECURE_HSTS_SECONDS = env_int('SECURE_HSTS_SECONDS', 0)
+
+SECURE_CONTENT_TYPE_NOSNIFF = True
+
+SECURE_BROWSER_XSS_FILTER = True
+
+X_FRAME_OPTIONS = 'DENY'
+
+if env_bool('BEHIND_PROXY'):
+    SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': env('LOG_LEVEL', 'WARNING'),
+    },
+}